@@ -0,0 +1,119 @@
+"""
+Opt-in micro-batching for `Call.coroutine`.
+
+Calls started within `AUTOBATCH_WINDOW` seconds of each other on the same event loop are grouped by web3 instance,
+block and gas limit, and each group is sent as a single `tryBlockAndAggregate` through `Multicall`.
+Every caller gets its own output back. Calls that fail inside the aggregate are sent again on their own,
+so they raise exactly the error they would have raised without autobatching.
+"""
+
+import asyncio
+import contextvars
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from web3 import Web3
+
+from multicall.constants import (AUTOBATCH, AUTOBATCH_SIZE, AUTOBATCH_WINDOW,
+                                 GAS_LIMIT)
+from multicall.envelope import canonical_address
+from multicall.loggers import setup_logger
+from multicall.utils import set_result
+
+logger = setup_logger(__name__)
+
+enabled: bool = AUTOBATCH
+
+def set_autobatch(enable: bool) -> None:
+    '''
+    Turns autobatching of `Call.coroutine` on or off for the whole process.
+    '''
+    global enabled
+    enabled = enable
+
+
+class Pending(NamedTuple):
+    target: bytes
+    calldata: bytes
+    future: asyncio.Future
+
+
+class Group:
+    def __init__(self, w3: Web3, block_id: Optional[int], gas_limit: int) -> None:
+        self.w3 = w3
+        self.block_id = block_id
+        self.gas_limit = gas_limit
+        self.calls: List[Pending] = []
+        self.handle: Optional[asyncio.Handle] = None
+
+
+class Dispatcher:
+    """ Collects the calls started on one event loop and sends them in groups. """
+    def __init__(self, window: float = AUTOBATCH_WINDOW, max_size: int = AUTOBATCH_SIZE) -> None:
+        self.window = window
+        self.max_size = max_size
+        self.groups: Dict[Hashable,Group] = {}
+
+    async def call(self, w3: Web3, args: List[Any]) -> Optional[bytes]:
+        """
+        Queues the eth_call described by `args` from `prep_args` and returns its output,
+        or None if it has to be sent on its own.
+        """
+        loop = asyncio.get_event_loop()
+        tx, block_id = args[0], args[1]
+        gas_limit = tx.get('gas') or GAS_LIMIT
+        key = w3, block_id, gas_limit
+        if key not in self.groups:
+            group = self.groups[key] = Group(w3, block_id, gas_limit)
+            if self.window:
+                group.handle = loop.call_later(self.window, self.flush, key)
+            else:
+                # Everything else that is ready to run gets the chance to join the group first.
+                group.handle = loop.call_soon(self.flush, key)
+        group = self.groups[key]
+        pending = Pending(canonical_address(tx['to']), bytes(tx['data']), loop.create_future())
+        group.calls.append(pending)
+        if len(group.calls) >= self.max_size:
+            self.flush(key)
+        return await pending.future
+
+    def flush(self, key: Hashable) -> None:
+        group = self.groups.pop(key, None)
+        if group is None:
+            return
+        group.handle.cancel()
+        if len(group.calls) == 1:
+            # Not worth an aggregate, send it the usual way.
+            set_result(group.calls[0].future, None)
+        else:
+            asyncio.ensure_future(self.send(group))
+
+    async def send(self, group: Group) -> None:
+        # `multicall.multicall` imports `multicall.call`, which imports this module.
+        from multicall.multicall import Multicall
+
+        outputs: List[Tuple[Optional[bool],Any]] = []
+        try:
+            # Built in a clean context, whoever opened the group might be inside a `Snapshot` and a `Call` without a block reads latest.
+            multicall = contextvars.Context().run(
+                Multicall, [], group.block_id, require_success=False, gas_limit=group.gas_limit, _w3=group.w3,
+            )
+            outputs = await multicall.fetch_cached_outputs([(call.target, call.calldata) for call in group.calls], id='autobatch')
+        except Exception as e:
+            logger.warning(f'autobatch of {len(group.calls)} calls failed, sending them one by one: {e!r}')
+        for i, call in enumerate(group.calls):
+            success, output = outputs[i] if outputs else (False, None)
+            # Failed calls are sent on their own so the caller gets the node's error.
+            set_result(call.future, bytes(output) if success is not False else None)
+
+
+dispatchers: "WeakKeyDictionary[asyncio.AbstractEventLoop,Dispatcher]" = WeakKeyDictionary()
+
+def get_dispatcher() -> Dispatcher:
+    '''
+    Returns the `Dispatcher` for the running event loop.
+    '''
+    loop = asyncio.get_event_loop()
+    if loop not in dispatchers:
+        dispatchers[loop] = Dispatcher()
+    return dispatchers[loop]
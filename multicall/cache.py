@@ -0,0 +1,137 @@
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from multicall.constants import CACHE, CACHE_BYTES
+from multicall.envelope import canonical_address
+from multicall.loggers import setup_logger
+from multicall.utils import chain_id
+
+logger = setup_logger(__name__)
+
+# chain id, target, calldata, block number
+CacheKey = Tuple[int,bytes,bytes,int]
+
+
+class ResultCache(ABC):
+    """
+    Stores the raw output of successful calls made at a specific block number.
+    Nothing else is cached, the result of a call at 'latest' or at a block hash can change.
+    Outputs at blocks that later get reorged out are not invalidated, so only use a cache with blocks that are final enough for you.
+    """
+    @abstractmethod
+    def get_many(self, keys: Sequence[CacheKey]) -> List[Optional[bytes]]:
+        ...
+
+    @abstractmethod
+    def set_many(self, items: Sequence[Tuple[CacheKey,bytes]]) -> None:
+        ...
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        return self.get_many([key])[0]
+
+    def set(self, key: CacheKey, output: bytes) -> None:
+        self.set_many([(key, output)])
+
+
+class MemoryCache(ResultCache):
+    """ LRU cache in memory, evicts the least recently used outputs once it holds more than `max_bytes` of keys and outputs. """
+    # Rough per entry overhead of the key tuple, the ints and the dict slot.
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int = CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[CacheKey,bytes]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_many(self, keys: Sequence[CacheKey]) -> List[Optional[bytes]]:
+        with self.lock:
+            outputs = []
+            for key in keys:
+                output = self.entries.get(key)
+                if output is not None:
+                    self.entries.move_to_end(key)
+                outputs.append(output)
+            return outputs
+
+    def set_many(self, items: Sequence[Tuple[CacheKey,bytes]]) -> None:
+        with self.lock:
+            for key, output in items:
+                if key in self.entries:
+                    continue
+                self.entries[key] = output
+                self.size += entry_size(key, output)
+            while self.size > self.max_bytes and self.entries:
+                key, output = self.entries.popitem(last=False)
+                self.size -= entry_size(key, output)
+
+
+def entry_size(key: CacheKey, output: bytes) -> int:
+    return len(key[1]) + len(key[2]) + len(output) + MemoryCache.ENTRY_OVERHEAD
+
+
+class SQLiteCache(ResultCache):
+    """ Cache in a SQLite database at `path`, which persists between runs and can be shared by several processes. """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS outputs ('
+            'chainid INTEGER, target BLOB, calldata BLOB, block INTEGER, output BLOB, '
+            'PRIMARY KEY (chainid, target, calldata, block))'
+        )
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[CacheKey]) -> List[Optional[bytes]]:
+        query = 'SELECT output FROM outputs WHERE chainid = ? AND target = ? AND calldata = ? AND block = ?'
+        with self.lock:
+            rows = [self.connection.execute(query, key).fetchone() for key in keys]
+        return [bytes(row[0]) if row else None for row in rows]
+
+    def set_many(self, items: Sequence[Tuple[CacheKey,bytes]]) -> None:
+        with self.lock:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO outputs VALUES (?, ?, ?, ?, ?)',
+                [(*key, bytes(output)) for key, output in items],
+            )
+            self.connection.execute('COMMIT')
+
+
+def cache_from_env(setting: Optional[str]) -> Optional[ResultCache]:
+    if not setting:
+        return None
+    if setting == 'memory':
+        return MemoryCache()
+    return SQLiteCache(setting)
+
+cache: Optional[ResultCache] = cache_from_env(CACHE)
+
+def get_cache() -> Optional[ResultCache]:
+    return cache
+
+def set_cache(new_cache: Optional[ResultCache]) -> None:
+    '''
+    Sets the cache used by every `Multicall` and `Call` in the process, or disables caching with None.
+    '''
+    global cache
+    cache = new_cache
+
+def call_key(w3: Web3, args: List[Any]) -> Optional[CacheKey]:
+    '''
+    Returns the cache key for an eth_call with `args` from `prep_calldata_args`, or None if there is no cache or the call can't be cached.
+    Calls with a state override aren't cached, their output isn't what the chain would return.
+    '''
+    block_id = args[1]
+    if cache is None or not isinstance(block_id, int) or len(args) > 2:
+        return None
+    return chain_id(w3), canonical_address(args[0]['to']), bytes(args[0]['data']), block_id
@@ -1,4 +1,6 @@
-from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+from collections import defaultdict
+from typing import (Any, Callable, Dict, Iterable, List, Optional, Tuple,
+                    Union)
 
 import eth_retry
 from eth_typing import Address, ChecksumAddress, HexAddress
@@ -7,10 +9,16 @@ from eth_utils import to_checksum_address
 from web3 import Web3
 
 from multicall import Signature
-from multicall.constants import Network, w3
+from multicall.signature import get_signature
+from multicall import autobatch
+from multicall.cache import call_key, get_cache
+from multicall.constants import MULTICALL3_ADDRESS, Network, w3
+from multicall.envelope import canonical_address
 from multicall.exceptions import StateOverrideNotSupported
 from multicall.loggers import setup_logger
-from multicall.utils import (chain_id, get_async_w3, run_in_subprocess,
+from multicall.singleflight import single_flight
+from multicall.transport import eth_call
+from multicall.utils import (chain_id, get_endpoint, run_in_subprocess,
                              state_override_supported)
 
 logger = setup_logger(__name__)
@@ -18,6 +26,12 @@ logger = setup_logger(__name__)
 AnyAddress = Union[str,Address,ChecksumAddress,HexAddress]
 
 class Call:
+    # Big multicalls hold a lot of these, so no __dict__.
+    __slots__ = (
+        'target_bytes', '_target', 'returns', 'block_id', 'gas_limit', 'state_override_code',
+        'w3', 'function', '_args', 'signature', '_data', 'allow_failure',
+    )
+
     def __init__(
         self, 
         target: AnyAddress, 
@@ -27,14 +41,17 @@ class Call:
         gas_limit: Optional[int] = None,
         state_override_code: Optional[str] = None, 
         # This needs to be None in order to use process_pool_executor
-        _w3: Web3 = None
+        _w3: Web3 = None,
+        # Whether this call may fail without failing the multicall. None follows the multicall's `require_success`.
+        allow_failure: Optional[bool] = None,
     ) -> None:
-        self.target = to_checksum_address(target)
+        self.target = target
         self.returns = returns
         self.block_id = block_id
         self.gas_limit = gas_limit
         self.state_override_code = state_override_code
         self.w3 = _w3
+        self.allow_failure = allow_failure
 
         self.args: Optional[List[Any]]
         if isinstance(function, list):
@@ -43,14 +60,38 @@ class Call:
             self.function = function
             self.args = None
 
-        self.signature = Signature(self.function)
+        self.signature = get_signature(self.function)
     
     def __repr__(self) -> str:
         return f'<Call {self.function} on {self.target[:8]}>'
 
+    @property
+    def target(self) -> ChecksumAddress:
+        # Checksumming costs a keccak, we only do it when someone needs the human readable address.
+        if self._target is None:
+            self._target = to_checksum_address(self.target_bytes)
+        return self._target
+
+    @target.setter
+    def target(self, target: AnyAddress) -> None:
+        self.target_bytes = canonical_address(target)
+        self._target = None
+
+    @property
+    def args(self) -> Optional[List[Any]]:
+        return self._args
+
+    @args.setter
+    def args(self, args: Optional[List[Any]]) -> None:
+        self._args = args
+        self._data = None
+
     @property
     def data(self) -> bytes:
-        return self.signature.encode_data(self.args)
+        # Encoded on first use and reused for every batch and retry after that. Reassigning `args` resets it.
+        if self._data is None:
+            self._data = self.signature.encode_data(self.args)
+        return self._data
 
     def decode_output(
         output: Decodable,
@@ -59,30 +100,17 @@ class Call:
         success: Optional[bool] = None
     ) -> Any:
     
-        if success is None:
-            apply_handler = lambda handler, value: handler(value)
-        else:
-            apply_handler = lambda handler, value: handler(success, value)
-
+        decoded = None
         if success is None or success:
             try:
                 decoded = signature.decode_data(output)
             except:
-                success, decoded = False, [None] * (1 if not returns else len(returns)) # type: ignore
-        else:
-            decoded = [None] * (1 if not returns else len(returns)) # type: ignore
+                pass
 
         logger.debug(f'returns: {returns}')
         logger.debug(f'decoded: {decoded}')
 
-        if returns:
-            return {
-                name: apply_handler(handler, value) if handler else value
-                for (name, handler), value
-                in zip(returns, decoded)
-            }
-        else:
-            return decoded if len(decoded) > 1 else decoded[0]
+        return apply_returns(decoded, returns, None if success is None else decoded is not None)
 
     @eth_retry.auto_retry
     def __call__(self, args: Optional[Any] = None, _w3: Optional[Web3] = None) -> Any:
@@ -118,10 +146,36 @@ class Call:
             self.state_override_code,
         )
 
-        output = await get_async_w3(_w3).eth.call(*args)
+        # Concurrent identical calls to the same endpoint share one request, nodes of the same chain can be at different heads.
+        key = chain_id(_w3), get_endpoint(_w3), self.target_bytes, args[0]['data'], self.block_id, self.gas_limit, self.state_override_code
+        output = await single_flight(key, lambda: fetch_output(_w3, args))
 
         return await run_in_subprocess(Call.decode_output, output, self.signature, self.returns)
     
+def eth_balance(
+    address: AnyAddress,
+    returns: Optional[Iterable[Tuple[str,Callable]]] = None,
+    block_id: Optional[int] = None,
+    allow_failure: Optional[bool] = None,
+) -> Call:
+    '''
+    Reads the native balance of `address` with Multicall3's `getEthBalance`, so it can go in the same batch as contract calls.
+    '''
+    return Call(MULTICALL3_ADDRESS, ['getEthBalance(address)(uint256)', address], returns, block_id, allow_failure=allow_failure)
+
+async def fetch_output(w3: Web3, args: List) -> bytes:
+    """ Sends an eth_call with `args` from `prep_args`, unless its output is in the result cache, or has it autobatched. """
+    key = call_key(w3, args)
+    output = get_cache().get(key) if key else None
+    # Calls with a state override can't go through the multicall contract.
+    if output is None and autobatch.enabled and len(args) == 2:
+        output = await autobatch.get_dispatcher().call(w3, args)
+    if output is None:
+        output = await eth_call(w3, args)
+        if key:
+            get_cache().set(key, bytes(output))
+    return output
+
 def prep_args(
     target: str, 
     signature: Signature, 
@@ -133,6 +187,16 @@ def prep_args(
 
     calldata = signature.encode_data(args)
 
+    return prep_calldata_args(target, calldata, block_id, gas_limit, state_override_code)
+
+def prep_calldata_args(
+    target: str, 
+    calldata: bytes, 
+    block_id: Optional[int], 
+    gas_limit: int, 
+    state_override_code: str,
+) -> List:
+
     args = [{'to': target, 'data': calldata}, block_id]
 
     if gas_limit:
@@ -142,3 +206,53 @@ def prep_args(
         args.append({target: {'code': state_override_code}})
 
     return args
+
+def apply_returns(
+    decoded: Optional[Tuple[Any,...]],
+    returns: Optional[Iterable[Tuple[str,Callable]]] = None,
+    success: Optional[bool] = None,
+) -> Any:
+    """
+    Applies `returns` handlers to an output decoded by `Signature.decode_data`, or to Nones if decoding failed.
+    When `success` is None, handlers only receive the decoded value.
+    """
+    if decoded is None:
+        decoded = [None] * (1 if not returns else len(returns)) # type: ignore
+
+    if success is None:
+        apply_handler = lambda handler, value: handler(value)
+    else:
+        apply_handler = lambda handler, value: handler(success, value)
+
+    if returns:
+        return {
+            name: apply_handler(handler, value) if handler else value
+            for (name, handler), value
+            in zip(returns, decoded)
+        }
+    else:
+        return decoded if len(decoded) > 1 else decoded[0]
+
+def decode_batch(
+    signatures: List[Signature],
+    signature_ids: List[int],
+    outputs: List[Tuple[Optional[bool],Decodable]],
+) -> List[Optional[Tuple[Any,...]]]:
+    """
+    Decodes a whole batch of outputs in one go, so a batch only crosses the process boundary once.
+    `signatures` holds each distinct signature once, `signature_ids` indexes into it for each output.
+    Outputs sharing a signature are decoded together with `Signature.decode_many`.
+    Outputs that failed or could not be decoded come back as None.
+    """
+    groups: Dict[int,List[int]] = defaultdict(list)
+    for i, (signature_id, (success, _)) in enumerate(zip(signature_ids, outputs)):
+        if success is None or success:
+            groups[signature_id].append(i)
+
+    decoded: List[Optional[Tuple[Any,...]]] = [None] * len(outputs)
+    for signature_id, indexes in groups.items():
+        values = signatures[signature_id].decode_many([outputs[i][1] for i in indexes])
+        for i, value in zip(indexes, values):
+            if not isinstance(value, Exception):
+                decoded[i] = value
+    return decoded
@@ -0,0 +1,58 @@
+"""
+Multicall without a multicall contract.
+
+An `eth_call` with no `to` runs its data as initcode. `DEPLOYLESS_INITCODE` makes each call appended to it in its constructor
+and returns the results as the code of the contract it would create, so it works at any block on any EVM chain,
+whether or not a multicall contract is deployed there and whether or not the node supports state overrides.
+"""
+
+from typing import List, Sequence, Tuple
+
+from eth_abi.exceptions import InsufficientDataBytes
+
+from multicall.envelope import Target, canonical_address
+
+# Reads the calls appended to it: for each one the target as a word with bit 255 set if it may fail,
+# the calldata length as a word and the calldata padded to words. Each call is made with CALL and all the gas there is.
+# A call that fails without being allowed to reverts everything, like `aggregate3`.
+# For each call it returns a word with the length of its output, and bit 255 set if it succeeded, then the output padded to words.
+#   payload = codesize - 118; codecopy(0, 118, payload); ptr = 0; k = payload
+#   loop: if ptr >= payload: return(payload, k - payload)
+#         ok = call(gas, mload(ptr) & address mask, 0, ptr + 64, mload(ptr + 32), 0, 0)
+#         if !ok && !(mload(ptr) >> 255): revert(0, 0)
+#         mstore(k, ok << 255 | returndatasize); returndatacopy(k + 32, 0, returndatasize)
+#         k += 32 + ceil32(returndatasize); ptr += 64 + ceil32(mload(ptr + 32))
+DEPLOYLESS_INITCODE = bytes.fromhex(
+    '6100763803806100766000398060005b8281101561006f5780602001516000600082846040016000865160601b60601c5af1'
+    '80835160ff1c1761004157600080fd5b60ff1b3d1783523d6000846020013e3d601f01601f191660200183019250601f01601f'
+    '19166040010161000f565b5081900390f3'
+)
+FLAG_BIT = 1 << 255
+# Initcode can't be more than 49,152 bytes. The output becomes contract code, which can't be more than 24,576 bytes,
+# batches whose outputs are too big fail and are split up.
+MAX_INITCODE_BYTES = 49_152
+
+
+def encode_deployless(calls: Sequence[Target], allow_failures: Sequence[bool]) -> bytes:
+    """ Encodes the data of a deployless `eth_call` that makes `calls`. """
+    return DEPLOYLESS_INITCODE + b''.join(
+        (int(allow_failure) << 255 | int.from_bytes(canonical_address(target), 'big')).to_bytes(32, 'big')
+        + len(data).to_bytes(32, 'big') + bytes(data) + bytes(-len(data) % 32)
+        for (target, data), allow_failure in zip(calls, allow_failures)
+    )
+
+def decode_deployless(output: bytes) -> List[Tuple[bool,memoryview]]:
+    """ Decodes the output of a deployless `eth_call` into the success and output of each call, without copying the outputs. """
+    data = memoryview(output)
+    results = []
+    position = 0
+    while position < len(data):
+        if position + 32 > len(data):
+            raise InsufficientDataBytes(f'Tried to read 32 bytes at {position}. Only got {len(data)} bytes')
+        word = int.from_bytes(data[position:position + 32], 'big')
+        length = word & (FLAG_BIT - 1)
+        if position + 32 + length > len(data):
+            raise InsufficientDataBytes(f'Tried to read {length} bytes at {position + 32}. Only got {len(data)} bytes')
+        results.append((bool(word & FLAG_BIT), data[position + 32:position + 32 + length]))
+        position += 32 + -(-length // 32) * 32
+    return results
@@ -0,0 +1,123 @@
+"""
+Specialized encoders and decoders for the multicall contract's own arguments and return values.
+
+The layouts of `(address,bytes)[]`, `(address,bool,bytes)[]`, `bytes[]` and `(bool,bytes)[]` never change, so instead of running them through eth_abi
+we write offsets and padded addresses straight into one preallocated buffer and slice the results out with memoryviews.
+"""
+
+from typing import List, Optional, Sequence, Tuple, Union
+
+from eth_abi.exceptions import InsufficientDataBytes
+from eth_typing import Address, ChecksumAddress, HexAddress
+
+AnyAddress = Union[str,Address,ChecksumAddress,HexAddress]
+Target = Tuple[AnyAddress,bytes]
+
+
+def canonical_address(address: AnyAddress) -> bytes:
+    if isinstance(address, (bytes, bytearray)):
+        if len(address) != 20:
+            raise ValueError(f'{address!r} is not a valid address')
+        return bytes(address)
+    raw = bytes.fromhex(address[2:] if address[:2] in ('0x', '0X') else address)
+    if len(raw) != 20:
+        raise ValueError(f'{address} is not a valid address')
+    return raw
+
+def encode_aggregate(fourbyte: bytes, calls: Sequence[Target], require_success: Optional[bool] = None) -> bytes:
+    """
+    Encodes calldata for `aggregate((address,bytes)[])` when `require_success` is None,
+    or for `tryAggregate(bool,(address,bytes)[])` / `tryBlockAndAggregate(bool,(address,bytes)[])` otherwise.
+    """
+    # Each tuple is an address word, an offset word, a length word and the padded calldata.
+    sizes = [96 + -(-len(data) // 32) * 32 for _, data in calls]
+    head = 4 + (32 if require_success is None else 64)
+    array = head + 32
+    buffer = bytearray(array + 32 * len(calls) + sum(sizes))
+
+    buffer[:4] = fourbyte
+    if require_success is None:
+        buffer[35] = 0x20
+    else:
+        buffer[35] = int(require_success)
+        buffer[67] = 0x40
+    buffer[head:array] = len(calls).to_bytes(32, 'big')
+
+    offset = 32 * len(calls)
+    for i, ((target, data), size) in enumerate(zip(calls, sizes)):
+        buffer[array + 32 * i:array + 32 * i + 32] = offset.to_bytes(32, 'big')
+        position = array + offset
+        buffer[position + 12:position + 32] = canonical_address(target)
+        buffer[position + 63] = 0x40
+        buffer[position + 64:position + 96] = len(data).to_bytes(32, 'big')
+        buffer[position + 96:position + 96 + len(data)] = data
+        offset += size
+    return bytes(buffer)
+
+def encode_aggregate3(fourbyte: bytes, calls: Sequence[Target], allow_failures: Sequence[bool]) -> bytes:
+    """ Encodes calldata for Multicall3's `aggregate3((address,bool,bytes)[])`, with an `allowFailure` flag for each call. """
+    # Each tuple is an address word, a bool word, an offset word, a length word and the padded calldata.
+    sizes = [128 + -(-len(data) // 32) * 32 for _, data in calls]
+    array = 4 + 32
+    buffer = bytearray(array + 32 + 32 * len(calls) + sum(sizes))
+
+    buffer[:4] = fourbyte
+    buffer[35] = 0x20
+    buffer[array:array + 32] = len(calls).to_bytes(32, 'big')
+
+    base = array + 32
+    offset = 32 * len(calls)
+    for i, ((target, data), allow_failure, size) in enumerate(zip(calls, allow_failures, sizes)):
+        buffer[base + 32 * i:base + 32 * i + 32] = offset.to_bytes(32, 'big')
+        position = base + offset
+        buffer[position + 12:position + 32] = canonical_address(target)
+        buffer[position + 63] = int(allow_failure)
+        buffer[position + 95] = 0x60
+        buffer[position + 96:position + 128] = len(data).to_bytes(32, 'big')
+        buffer[position + 128:position + 128 + len(data)] = data
+        offset += size
+    return bytes(buffer)
+
+def _word(data: memoryview, position: int) -> int:
+    if position + 32 > len(data):
+        raise InsufficientDataBytes(f'Tried to read 32 bytes at {position}. Only got {len(data)} bytes')
+    return int.from_bytes(data[position:position + 32], 'big')
+
+def _bytes(data: memoryview, position: int) -> memoryview:
+    length = _word(data, position)
+    if position + 32 + length > len(data):
+        raise InsufficientDataBytes(f'Tried to read {length} bytes at {position + 32}. Only got {len(data)} bytes')
+    return data[position + 32:position + 32 + length]
+
+def decode_bytes_array(data: memoryview, position: int) -> List[memoryview]:
+    """ Decodes the `bytes[]` that starts at `position`. """
+    base = position + 32
+    return [_bytes(data, base + _word(data, base + 32 * i)) for i in range(_word(data, position))]
+
+def decode_results_array(data: memoryview, position: int) -> List[Tuple[bool,memoryview]]:
+    """ Decodes the `(bool,bytes)[]` that starts at `position`. """
+    base = position + 32
+    results = []
+    for i in range(_word(data, position)):
+        element = base + _word(data, base + 32 * i)
+        results.append((_word(data, element) == 1, _bytes(data, element + _word(data, element + 32))))
+    return results
+
+def decode_aggregate(output: bytes) -> Tuple[int,List[memoryview]]:
+    """ Decodes the `(uint256,bytes[])` returned by `aggregate`. """
+    data = memoryview(output)
+    return _word(data, 0), decode_bytes_array(data, _word(data, 32))
+
+def decode_try_aggregate(output: bytes) -> List[Tuple[bool,memoryview]]:
+    """ Decodes the `(bool,bytes)[]` returned by `tryAggregate`. """
+    data = memoryview(output)
+    return decode_results_array(data, _word(data, 0))
+
+def decode_aggregate3(output: bytes) -> List[Tuple[bool,memoryview]]:
+    """ Decodes the `(bool,bytes)[]` returned by `aggregate3`, laid out just like `tryAggregate`'s. """
+    return decode_try_aggregate(output)
+
+def decode_try_block_and_aggregate(output: bytes) -> Tuple[int,int,List[Tuple[bool,memoryview]]]:
+    """ Decodes the `(uint256,bytes32,(bool,bytes)[])` returned by `tryBlockAndAggregate`, with the block hash as an int. """
+    data = memoryview(output)
+    return _word(data, 0), _word(data, 32), decode_results_array(data, _word(data, 64))
@@ -1,3 +1,6 @@
 
 class StateOverrideNotSupported(Exception):
     pass
+
+class PayloadTooLarge(Exception):
+    """ Raised when a request is too large for every endpoint that could serve it. The batch gets split up. """
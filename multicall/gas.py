@@ -0,0 +1,179 @@
+"""
+Learned gas costs of calls, used to pack batches under the gas limit.
+
+A `GasProfile` holds the gas used by a sample call for each (target, selector). Calls without an estimate are measured before
+they are batched, one sample per (target, selector), with a deployless eth_call: the constructor of `GAS_METER_INITCODE` makes
+each sample call and returns the gas it used, so nothing has to be deployed and the node doesn't need to support state overrides.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from multicall.constants import GAS_LIMIT, GAS_PROFILE
+from multicall.envelope import Target, canonical_address
+from multicall.loggers import setup_logger
+from multicall.transport import eth_call
+from multicall.utils import gather
+
+logger = setup_logger(__name__)
+
+# Reads the samples appended to it: for each one the target as a word, the calldata length as a word and the calldata padded to words.
+# Each sample is run with STATICCALL and all the gas there is. For each one a word is returned with the gas used in the low 128 bits,
+# the gas there was before the call from bit 128 and bit 255 set if it succeeded.
+#   payload = codesize - 86; codecopy(0, 86, payload); ptr = k = 0
+#   loop: if ptr >= payload: return(payload, k)
+#         g = gas; ok = staticcall(gas, mload(ptr), ptr + 64, mload(ptr + 32), 0, 0)
+#         mstore(payload + k, ok << 255 | g << 128 | g - gas); ptr += 64 + ceil32(mload(ptr + 32)); k += 32
+GAS_METER_INITCODE = bytes.fromhex(
+    '610056380380610056600039600060005b828110156100525780602001515a60006000838560400186515afa'
+    '5a82039060ff1b178160801b178585015250601f01601f1916604001019060200190610010565b5090f3'
+)
+SUCCESS_BIT = 1 << 255
+GAS_MASK = (1 << 128) - 1
+# The meter's output becomes the code of the contract it creates, which can't be more than 24,576 bytes.
+# Initcode can't be more than 49,152 bytes, so the samples in one request are limited too.
+MAX_SAMPLES = 512
+MAX_SAMPLE_BYTES = 48_000
+# A failed sample that used at least this share of the gas forwarded to it ran out of gas or hit INVALID.
+BURNED_GAS_RATIO = 0.9
+
+GasKey = Tuple[bytes,bytes]
+
+
+def gas_key(target: Target) -> GasKey:
+    address, data = target
+    return canonical_address(address), bytes(data[:4])
+
+def encode_samples(targets: Sequence[Target]) -> bytes:
+    return b''.join(
+        canonical_address(address).rjust(32, b'\0') + len(data).to_bytes(32, 'big') + bytes(data) + bytes(-len(data) % 32)
+        for address, data in targets
+    )
+
+def decode_gas(output: bytes) -> List[Tuple[bool,int,int]]:
+    """ Decodes whether each sample succeeded, the gas it used and the gas there was before it. """
+    words = [int.from_bytes(output[i:i+32], 'big') for i in range(0, len(output), 32)]
+    return [(bool(word & SUCCESS_BIT), word & GAS_MASK, (word & (SUCCESS_BIT - 1)) >> 128) for word in words]
+
+def usable_gas(samples: Sequence[Target], measured: Sequence[Tuple[bool,int,int]]) -> List[Tuple[GasKey,int]]:
+    """
+    The gas of each sample worth recording. Failed calls that reverted still tell us roughly what they cost,
+    but one that burned all the gas it was forwarded says nothing and would keep the call in a batch of its own forever.
+    """
+    usable = []
+    for sample, (success, gas, available) in zip(samples, measured):
+        # A call gets all but 1/64th of the gas there is.
+        if success or gas < (available - available // 64) * BURNED_GAS_RATIO:
+            usable.append((gas_key(sample), gas))
+    return usable
+
+def chunk_samples(targets: Sequence[Target]) -> List[List[Target]]:
+    chunks: List[List[Target]] = []
+    size = MAX_SAMPLE_BYTES
+    for target in targets:
+        sample_size = 64 + -(-len(target[1]) // 32) * 32
+        if size + sample_size > MAX_SAMPLE_BYTES or len(chunks[-1]) >= MAX_SAMPLES:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(target)
+        size += sample_size
+    return chunks
+
+
+class GasProfile:
+    """
+    Gas used by a sample call to each (target, selector), kept in memory and in a json file at `path` if given.
+    Estimates are the largest gas measured times `1 + margin`, plus `overhead` for what the aggregate contract spends on each call.
+    """
+    def __init__(self, path: Optional[str] = None, margin: float = 0.25, overhead: int = 2_000) -> None:
+        self.path = path
+        self.margin = margin
+        self.overhead = overhead
+        self.gas: Dict[GasKey,int] = {}
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.gas)
+
+    def estimate(self, target: bytes, data: bytes) -> Optional[int]:
+        gas = self.gas.get(gas_key((target, data)))
+        return None if gas is None else int(gas * (1 + self.margin)) + self.overhead
+
+    def record(self, items: Sequence[Tuple[GasKey,int]]) -> None:
+        with self.lock:
+            for key, gas in items:
+                self.gas[key] = max(gas, self.gas.get(key, 0))
+            if self.path is not None:
+                self.save()
+
+    def unknown(self, targets: Sequence[Target]) -> List[Target]:
+        """ Returns one of `targets` for each (target, selector) that doesn't have an estimate yet. """
+        samples: Dict[GasKey,Target] = {}
+        for target in targets:
+            key = gas_key(target)
+            if key not in self.gas and key not in samples:
+                samples[key] = target
+        return list(samples.values())
+
+    async def measure(self, w3: Web3, targets: Sequence[Target], block_id: Optional[int] = None, gas_limit: int = GAS_LIMIT) -> None:
+        """ Measures a sample of each (target, selector) in `targets` that doesn't have an estimate yet. Failures are logged and ignored. """
+        samples = self.unknown(targets)
+        if samples:
+            await gather([self.measure_chunk(w3, chunk, block_id, gas_limit) for chunk in chunk_samples(samples)])
+
+    async def measure_chunk(self, w3: Web3, samples: List[Target], block_id: Optional[int], gas_limit: int) -> None:
+        args = [{'data': GAS_METER_INITCODE + encode_samples(samples), 'gas': gas_limit}, block_id]
+        try:
+            output = await eth_call(w3, args)
+        except Exception as e:
+            logger.warning(f'Unable to measure the gas used by {len(samples)} calls: {e!r}')
+            return
+        measured = decode_gas(output)
+        if len(measured) != len(samples):
+            logger.warning(f'Expected gas for {len(samples)} calls, got {len(measured)}.')
+            return
+        usable = usable_gas(samples, measured)
+        if len(usable) < len(samples):
+            logger.debug(f'{len(samples) - len(usable)} calls failed after burning the gas they were given, leaving them unmeasured')
+        self.record(usable)
+        logger.debug(f'Measured the gas used by {len(samples)} calls')
+
+    def load(self) -> None:
+        with open(self.path) as f:
+            entries = json.load(f)
+        for key, gas in entries.items():
+            address, selector = key.split(':')
+            self.gas[bytes.fromhex(address[2:]), bytes.fromhex(selector[2:])] = gas
+
+    def save(self) -> None:
+        entries = {f'0x{address.hex()}:0x{selector.hex()}': gas for (address, selector), gas in self.gas.items()}
+        # Write and rename, so an interrupted write never leaves a broken profile behind.
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(entries, f)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def profile_from_env(setting: Optional[str]) -> Optional[GasProfile]:
+    if not setting:
+        return None
+    if setting == 'memory':
+        return GasProfile()
+    return GasProfile(setting)
+
+gas_profile: Optional[GasProfile] = profile_from_env(GAS_PROFILE)
+
+def get_gas_profile() -> Optional[GasProfile]:
+    return gas_profile
+
+def set_gas_profile(new_profile: Optional[GasProfile]) -> None:
+    '''
+    Sets the gas profile used to batch every `Multicall` and `CallTable` in the process, or stops learning gas costs with None.
+    '''
+    global gas_profile
+    gas_profile = new_profile
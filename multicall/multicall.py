@@ -1,22 +1,72 @@
 import asyncio
+import os
+from collections import deque
+from copy import copy
+from itertools import islice
 from time import time
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import (Any, AsyncIterator, Deque, Dict, Iterable, Iterator, List,
+                    NamedTuple, Optional, Sequence, Set, Tuple, Union)
 
 import aiohttp
+import eth_retry
 import requests
+from eth_abi.exceptions import InsufficientDataBytes
 from web3 import Web3
+from web3.exceptions import ContractLogicError
 
-from multicall import Call
-from multicall.constants import (GAS_LIMIT, MULTICALL2_ADDRESSES,
-                                 MULTICALL2_BYTECODE, MULTICALL_ADDRESSES, w3)
+from multicall import Call, Signature
+from multicall.call import apply_returns, decode_batch, prep_calldata_args
+from multicall.cache import get_cache
+from multicall.constants import (CALL_GAS_ESTIMATE, GAS_LIMIT,
+                                 MAX_CALLDATA_BYTES, MULTICALL2_ADDRESSES,
+                                 MULTICALL2_BYTECODE, MULTICALL3_ADDRESSES,
+                                 MULTICALL3_BYTECODE,
+                                 MULTICALL_ADDRESSES, NUM_PROCESSES, w3)
+from multicall.deployless import (DEPLOYLESS_INITCODE, MAX_INITCODE_BYTES,
+                                  decode_deployless, encode_deployless)
+from multicall.envelope import (Target, canonical_address, decode_aggregate,
+                                decode_aggregate3,
+                                decode_try_block_and_aggregate,
+                                encode_aggregate, encode_aggregate3)
+from multicall.exceptions import PayloadTooLarge
+from multicall.gas import get_gas_profile
 from multicall.loggers import setup_logger
+from multicall.signature import get_signature
+from multicall.singleflight import get_in_flight, resolve, wait_for
+from multicall.snapshot import BlockIdentifier, get_snapshot
+from multicall.transport import eth_call
 from multicall.utils import (await_awaitable, chain_id, gather,
+                             get_endpoint, iterate_sync,
                              run_in_subprocess, state_override_supported)
 
 logger = setup_logger(__name__)
 
 CallResponse = Tuple[Union[None,bool],bytes]
 
+# Outputs are only split across worker processes in chunks at least this big.
+MIN_DECODE_CHUNK = 1_000
+
+# (chain id, target, selector) of calls that made an aggregate revert. Multicalls with `isolate_failures` send them with `tryBlockAndAggregate`.
+known_failures: Set[Tuple[int,bytes,bytes]] = set()
+
+def failure_key(chainid: int, target: Target) -> Tuple[int,bytes,bytes]:
+    address, data = target
+    return chainid, canonical_address(address), bytes(data[:4])
+
+def get_allow_failures(calls: List[Call], default: bool) -> Dict[Tuple[bytes,bytes],bool]:
+    """
+    The failure policy of each (target, calldata), if any call has its own `allow_failure`, otherwise an empty dict.
+    When identical calls disagree, the strict one wins.
+    """
+    if all(call.allow_failure is None or call.allow_failure == default for call in calls):
+        return {}
+    allow_failures: Dict[Tuple[bytes,bytes],bool] = {}
+    for call in calls:
+        allow_failure = default if call.allow_failure is None else call.allow_failure
+        key = call.target_bytes, call.data
+        allow_failures[key] = allow_failures.get(key, True) and allow_failure
+    return allow_failures
+
 def get_args(calls: List[Call], require_success: bool = True) -> List[Union[bool,List[List[Any]]]]:
     if require_success is True:
         return [[[call.target, call.data] for call in calls]]
@@ -28,6 +78,44 @@ def unpack_aggregate_outputs(outputs: Any) -> Tuple[CallResponse,...]:
 def unpack_batch_results(batch_results: List[List[CallResponse]]) -> List[CallResponse]:
     return [result for batch in batch_results for result in batch]
 
+def merge_outputs(outputs: List[Dict[str,Any]]) -> Dict[str,Any]:
+    return {
+        name: result
+        for output in outputs
+        for name, result in output.items()
+    }
+
+
+class SweepChunk(NamedTuple):
+    blocks: List[int]
+    # One column per `returns` name, with a value for each block.
+    columns: Dict[str,List[Any]]
+
+def add_to_chunk(chunk: SweepChunk, block: int, result: Dict[str,Any]) -> None:
+    chunk.blocks.append(block)
+    for name, value in result.items():
+        if name not in chunk.columns:
+            chunk.columns[name] = [None] * (len(chunk.blocks) - 1)
+        chunk.columns[name].append(value)
+    # Names missing from this block's result, like calls that failed and were isolated, get None so the columns stay in line.
+    for name, column in chunk.columns.items():
+        if name not in result:
+            column.append(None)
+
+def read_checkpoint(path: Optional[str]) -> Optional[int]:
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return int(f.read().strip())
+
+def write_checkpoint(path: Optional[str], block: int) -> None:
+    if path is None:
+        return
+    # Write and rename, so an interrupted write never leaves a broken checkpoint behind.
+    with open(path + '.tmp', 'w') as f:
+        f.write(str(block))
+    os.replace(path + '.tmp', path)
+
 
 class Multicall:
     def __init__(
@@ -36,7 +124,11 @@ class Multicall:
         block_id: Optional[int] = None, 
         require_success: bool = True,
         gas_limit: int = GAS_LIMIT,
-        _w3: Web3 = w3
+        _w3: Web3 = w3,
+        batcher: Optional["NotSoBrightBatcher"] = None,
+        priority: int = 0,
+        isolate_failures: bool = False,
+        deployless: bool = False,
     ) -> None:
         self.calls = calls
         self.block_id = block_id
@@ -44,13 +136,40 @@ class Multicall:
         self.gas_limit = gas_limit
         self.w3 = _w3
         self.chainid = chain_id(self.w3)
-        if require_success is True:
-            multicall_map = MULTICALL_ADDRESSES if self.chainid in MULTICALL_ADDRESSES else MULTICALL2_ADDRESSES
-            self.multicall_sig = 'aggregate((address,bytes)[])(uint256,bytes[])'
+        # Created inside a `Snapshot` without a block, every batch reads the snapshot's block.
+        self.snapshot = get_snapshot(self.w3) if block_id is None else None
+        if self.snapshot is not None:
+            self.block_id = self.snapshot.block_number
+        # When the endpoint's scheduler is saturated, batches of multicalls with a higher priority are sent first.
+        self.priority = priority
+        # With `require_success`, a reverting batch is narrowed down to the calls that failed instead of raising.
+        # Their results are left out and the calls are listed in `self.failures`.
+        self.isolate_failures = isolate_failures and require_success is True
+        self.failures: List[Call] = []
+        # Calls with an `allow_failure` of None follow `require_success`.
+        self.default_allow_failure = require_success is not True
+        self.allow_failures = get_allow_failures(calls, self.default_allow_failure)
+        # Multicall3 takes a failure policy for each call, and is used wherever it is deployed.
+        # Calls with their own failure policy on other chains, chains without any multicall contract and multicalls created
+        # with `deployless` make the calls in the constructor of an eth_call with no `to`, which works at any block on any chain.
+        multicall_map = MULTICALL_ADDRESSES if require_success is True and MULTICALL_ADDRESSES.get(self.chainid) else MULTICALL2_ADDRESSES
+        self.v3 = not deployless and self.chainid in MULTICALL3_ADDRESSES
+        self.deployless = not self.v3 and (deployless or bool(self.allow_failures) or not multicall_map.get(self.chainid))
+        self.multicall_address: Optional[str]
+        self.multicall_sig: Optional[str]
+        if self.deployless:
+            self.multicall_address = self.multicall_sig = None
+        elif self.v3:
+            self.multicall_address = MULTICALL3_ADDRESSES[self.chainid]
+            self.multicall_sig = 'aggregate3((address,bool,bytes)[])((bool,bytes)[])'
         else:
-            multicall_map = MULTICALL2_ADDRESSES
-            self.multicall_sig = 'tryBlockAndAggregate(bool,(address,bytes)[])(uint256,uint256,(bool,bytes)[])'
-        self.multicall_address = multicall_map[self.chainid]
+            self.multicall_address = multicall_map[self.chainid]
+            if require_success is True:
+                self.multicall_sig = 'aggregate((address,bytes)[])(uint256,bytes[])'
+            else:
+                self.multicall_sig = 'tryBlockAndAggregate(bool,(address,bytes)[])(uint256,uint256,(bool,bytes)[])'
+        # Unless a batcher is passed in, share one with every other Multicall that talks to the same endpoint and chain the same way.
+        self.batcher = batcher or get_batcher(self.w3, self.deployless)
 
     def __call__(self) -> Dict[str,Any]:
         start = time()
@@ -59,49 +178,427 @@ class Multicall:
         return response
 
     async def coroutine(self) -> Dict[str,Any]:
+        self.failures = []
+        await self.measure_gas([(call.target_bytes, call.data) for call in self.calls])
         batches = await gather([
             self.fetch_outputs(batch, id=str(i)) 
-            for i,batch in enumerate(batcher.batch_calls(self.calls,batcher.step))
+            for i,batch in enumerate(self.batcher.batch_calls(self.calls, self.batcher.step))
         ])
-        outputs = await run_in_subprocess(unpack_batch_results, batches)
+        return merge_outputs(unpack_batch_results(batches))
+
+    async def stream(self, ordered: bool = False) -> AsyncIterator[Dict[str,Any]]:
+        """
+        Yields the results of each batch as soon as it is decoded, instead of waiting for the whole multicall.
+        Batches are yielded in the order they complete, or in the order of `self.calls` if `ordered` is True.
+        Batches still running when the generator is closed are cancelled.
+        """
+        self.failures = []
+        await self.measure_gas([(call.target_bytes, call.data) for call in self.calls])
+        tasks = [
+            asyncio.ensure_future(self.fetch_outputs(batch, id=str(i)))
+            for i, batch in enumerate(self.batcher.batch_calls(self.calls, self.batcher.step))
+        ]
+        try:
+            for task in tasks if ordered else asyncio.as_completed(tasks):
+                yield merge_outputs(await task)
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            # Wait for the cancellations so nothing is left running, or logged as never retrieved, after we return.
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stream_sync(self, ordered: bool = False) -> Iterator[Dict[str,Any]]:
+        """ Sync counterpart of `stream`. Each batch is fetched on the event loop while the caller waits for the next item. """
+        return iterate_sync(self.stream(ordered))
+
+    async def sweep(
+        self,
+        blocks: Iterable[int],
+        step: int = 1,
+        concurrency: int = 8,
+        chunk_size: int = 100,
+        checkpoint: Optional[str] = None,
+    ) -> AsyncIterator[SweepChunk]:
+        """
+        Runs this multicall at every `step`th block of `blocks` and yields the results in chunks of `chunk_size` blocks, in block order.
+        Each chunk has the blocks and a column per `returns` name with the value at each block.
+
+        The calls are batched and the aggregate calldata is encoded once, then sent at up to `concurrency` blocks at a time.
+        Batches that are already in the result cache are not sent. With a `checkpoint` file, the last block of each chunk
+        is written to it once the chunk has been consumed, and blocks up to the checkpoint are skipped when sweeping again.
+        `blocks` have to be increasing for checkpoints to make sense.
+        """
+        last_done = read_checkpoint(checkpoint)
+        blocks = iter([block for block in islice(blocks, 0, None, step) if last_done is None or block > last_done])
+        await self.measure_gas([(call.target_bytes, call.data) for call in self.calls])
+        batches = []
+        for batch in self.batcher.batch_calls(self.calls, self.batcher.step):
+            targets = [(call.target_bytes, call.data) for call in batch]
+            batches.append((batch, targets, self.encode_aggregate(targets)))
+
+        pending: Deque[Tuple[int,asyncio.Future]] = deque()
+        chunk = SweepChunk([], {})
+        try:
+            while True:
+                for block in islice(blocks, concurrency - len(pending)):
+                    pending.append((block, asyncio.ensure_future(self.at_block(block).fetch_encoded(batches))))
+                if not pending:
+                    break
+                block, task = pending.popleft()
+                add_to_chunk(chunk, block, await task)
+                if len(chunk.blocks) >= chunk_size:
+                    yield chunk
+                    write_checkpoint(checkpoint, chunk.blocks[-1])
+                    chunk = SweepChunk([], {})
+            if chunk.blocks:
+                yield chunk
+                write_checkpoint(checkpoint, chunk.blocks[-1])
+        finally:
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*[task for _, task in pending], return_exceptions=True)
 
-        return {
-            name: result
-            for output in outputs
-            for name, result in output.items()
-        }
+    def sweep_sync(self, blocks: Iterable[int], step: int = 1, **kwargs: Any) -> Iterator[SweepChunk]:
+        """ Sync counterpart of `sweep`. """
+        return iterate_sync(self.sweep(blocks, step, **kwargs))
+
+    async def measure_gas(self, targets: Sequence[Target]) -> None:
+        """ With a gas profile, measures the calls in `targets` it has no estimate for, so the batcher can pack them by gas. """
+        profile = get_gas_profile()
+        if profile is not None:
+            await profile.measure(self.w3, targets, self.block_id, self.gas_limit)
+
+    @property
+    def block_identifier(self) -> Optional[BlockIdentifier]:
+        """ The block sent with each `eth_call`, which is the snapshot's block hash for multicalls in a `Snapshot` by hash. """
+        if self.snapshot is not None and self.block_id == self.snapshot.block_number:
+            return self.snapshot.block_identifier
+        return self.block_id
+
+    def at_block(self, block_id: Optional[int]) -> "Multicall":
+        """ Returns a copy of this multicall at `block_id`, without looking anything up again. """
+        multicall = copy(self)
+        multicall.block_id = block_id
+        return multicall
+
+    async def fetch_encoded(self, batches: List[Tuple[List[Call],List[Target],bytes]]) -> Dict[str,Any]:
+        """ Fetches batches with pre-encoded aggregate calldata at `self.block_id` and returns the merged results. """
+        return merge_outputs(unpack_batch_results(await gather([
+            self.fetch_encoded_batch(calls, targets, calldata)
+            for calls, targets, calldata in batches
+        ])))
+
+    async def fetch_encoded_batch(self, calls: List[Call], targets: List[Target], calldata: bytes) -> List[Any]:
+        cache = get_cache() if isinstance(self.block_id, int) else None
+        outputs: Optional[Sequence[CallResponse]] = None
+        if cache is not None:
+            keys = [(self.chainid, canonical_address(target), data, self.block_id) for target, data in targets]
+            cached = cache.get_many(keys)
+            if all(output is not None for output in cached):
+                outputs = [(True if self.allows_failure(target) else None, output) for target, output in zip(targets, cached)]
+
+        if outputs is None:
+            try:
+                if self.isolate_failures and any(failure_key(self.chainid, target) in known_failures for target in targets):
+                    # The pre-encoded calldata would revert, let `fetch_raw_outputs` route the known failures.
+                    outputs = await self.fetch_raw_outputs(targets, 0, str(self.block_id))
+                else:
+                    outputs = self.mark_outputs(targets, await self.send_aggregate(calldata))
+                    self.batcher.record_success(targets)
+            except Exception as e:
+                if self.isolate_failures and is_revert(e):
+                    outputs = await self.isolate(targets, str(self.block_id))
+                else:
+                    _raise_or_proceed(e, len(targets), ConnErr_retries=0)
+                    outputs = unpack_batch_results(await gather([
+                        self.fetch_raw_outputs(chunk, 1, f"{self.block_id}_{i}")
+                        for i, chunk in enumerate(await self.batcher.rebatch(targets))
+                    ]))
+            if cache is not None:
+                cache.set_many([(key, bytes(output)) for key, (ok, output) in zip(keys, outputs) if ok is not False])
+
+        values = await self.decode_values(calls, outputs)
+        self.failures.extend(call for call, (success, _) in zip(calls, outputs) if self.isolated(call, success))
+        return [
+            apply_returns(value, call.returns, value is not None if self.call_allows_failure(call) else None)
+            for call, value, (success, _) in zip(calls, values, outputs)
+            if not self.isolated(call, success)
+        ]
 
     async def fetch_outputs(self, calls: List[Call], ConnErr_retries: int = 0, id: str = '') -> List[CallResponse]:
         logger.debug(f"coroutine {id} started")
 
         if calls is None:
             calls = self.calls
-        
-        try:
-            args = await run_in_subprocess(get_args, calls, self.require_success)
-            if self.require_success is True:
-                _, outputs = await self.aggregate.coroutine(args)
-                outputs = await run_in_subprocess(unpack_aggregate_outputs, outputs)
+
+        # Identical calls are only fetched and decoded once, then each one's `returns` is applied to the shared value.
+        positions: Dict[Tuple[bytes,bytes,str],int] = {}
+        unique_calls: List[Call] = []
+        indexes: List[int] = []
+        for call in calls:
+            key = call.target_bytes, call.data, call.signature.signature
+            if key not in positions:
+                positions[key] = len(unique_calls)
+                unique_calls.append(call)
+            indexes.append(positions[key])
+
+        outputs = await self.fetch_cached_outputs([(call.target_bytes, call.data) for call in unique_calls], ConnErr_retries, id)
+        values = await self.decode_values(unique_calls, outputs)
+        logger.debug(f"coroutine {id} finished")
+        self.failures.extend(call for call, i in zip(calls, indexes) if self.isolated(call, outputs[i][0]))
+        return [
+            apply_returns(values[i], call.returns, values[i] is not None if self.call_allows_failure(call) else None)
+            for call, i in zip(calls, indexes)
+            if not self.isolated(call, outputs[i][0])
+        ]
+
+    def call_allows_failure(self, call: Call) -> bool:
+        """ Whether `call` may fail, which decides if its `returns` handlers get `(success, value)` or the value alone. """
+        return self.default_allow_failure if call.allow_failure is None else call.allow_failure
+
+    def isolated(self, call: Call, success: Optional[bool]) -> bool:
+        """ Whether `call` is a strict call that failed and was isolated, so it goes in `self.failures` instead of the results. """
+        return self.isolate_failures and success is False and not self.call_allows_failure(call)
+
+    def allows_failure(self, target: Target) -> bool:
+        """ Whether the call to `target` may fail without failing its batch. """
+        if not self.allow_failures:
+            return self.default_allow_failure
+        address, data = target
+        return self.allow_failures.get((canonical_address(address), bytes(data)), self.default_allow_failure)
+
+    def mark_outputs(self, targets: Sequence[Target], outputs: Sequence[CallResponse]) -> List[CallResponse]:
+        """
+        Turns `aggregate3` outputs into the form the rest of the pipeline expects: `(success, output)` for calls that may fail,
+        `(None, output)` for calls that may not, so their `returns` handlers get the value alone.
+        """
+        if len(outputs) != len(targets):
+            raise InsufficientDataBytes(f'Got {len(outputs)} outputs for a batch of {len(targets)} calls')
+        if not self.allow_failures:
+            if self.default_allow_failure:
+                return list(outputs)
+            return [(None, output) for _, output in outputs]
+        return [(success if self.allows_failure(target) else None, output) for target, (success, output) in zip(targets, outputs)]
+
+    async def fetch_cached_outputs(self, targets: List[Target], ConnErr_retries: int = 0, id: str = '') -> List[CallResponse]:
+        """
+        Same as `fetch_raw_outputs`, but only sends the calls that aren't in the result cache
+        and aren't already in flight in another multicall on this event loop.
+        """
+        cache = get_cache() if isinstance(self.block_id, int) else None
+        allow_failures = [self.allows_failure(target) for target in targets]
+        outputs: List[Optional[CallResponse]] = [None] * len(targets)
+        keys = [(self.chainid, canonical_address(target), data, self.block_id) for target, data in targets]
+        if cache is not None:
+            for i, output in enumerate(cache.get_many(keys)):
+                if output is not None:
+                    outputs[i] = (True if allow_failures[i] else None), output
+
+        # The output of a call depends on the gas and on how the multicall handles failures, they are part of the key.
+        # So is the endpoint, nodes of the same chain can be at different heads or disagree.
+        in_flight = get_in_flight()
+        endpoint = get_endpoint(self.w3)
+        flight_keys = [key + (endpoint, self.gas_limit, allow_failures[i], self.isolate_failures) for i, key in enumerate(keys)]
+        owned: List[int] = []
+        waiting: List[int] = []
+        futures: List[asyncio.Future] = []
+        for i, output in enumerate(outputs):
+            if output is not None:
+                continue
+            if flight_keys[i] in in_flight:
+                # Also for repeats of a call we fetch ourselves, its future leaves `in_flight` once it resolves.
+                waiting.append(i)
+                futures.append(in_flight[flight_keys[i]])
             else:
-                _, _, outputs = await self.aggregate.coroutine(args)
-            outputs = await gather([
-                run_in_subprocess(Call.decode_output, output, call.signature, call.returns, success)
-                for call, (success, output) in zip(calls, outputs)
-            ])
-            logger.debug(f"coroutine {id} finished")
+                in_flight[flight_keys[i]] = asyncio.get_event_loop().create_future()
+                owned.append(i)
+
+        if owned:
+            try:
+                fetched = await self.fetch_raw_outputs([targets[i] for i in owned], ConnErr_retries, id)
+            except BaseException as e:
+                for i in owned:
+                    resolve(in_flight.pop(flight_keys[i]), exception=e)
+                raise
+            for i, output in zip(owned, fetched):
+                outputs[i] = output
+                resolve(in_flight.pop(flight_keys[i]), output)
+            if cache is not None:
+                # Failed calls aren't cached, they could have run out of gas.
+                cache.set_many([(keys[i], bytes(output)) for i, (ok, output) in zip(owned, fetched) if ok is not False])
+
+        if waiting:
+            results = await asyncio.gather(*[wait_for(future) for future in futures], return_exceptions=True)
+            retry = []
+            for i, future, result in zip(waiting, futures, results):
+                if future.cancelled() or isinstance(result, BaseException):
+                    # Whoever was fetching it was cancelled, or failed, most likely because of another call in their batch.
+                    # We'll fetch it ourselves, so we only ever raise our own calls' errors.
+                    retry.append(i)
+                else:
+                    outputs[i] = result
+            if retry:
+                for i, output in zip(retry, await self.fetch_cached_outputs([targets[i] for i in retry], ConnErr_retries, id)):
+                    outputs[i] = output
+
+        logger.debug(f"coroutine {id}: {len(targets) - len(owned)} of {len(targets)} outputs were cached or in flight")
+        return outputs
+
+    async def fetch_raw_outputs(self, targets: List[Target], ConnErr_retries: int = 0, id: str = '') -> List[CallResponse]:
+        """
+        Sends `(target, calldata)` pairs through the multicall contract and returns the undecoded output of each.
+        If the node can't handle the batch, it is split up and retried.
+        """
+        if self.isolate_failures:
+            suspects = [i for i, target in enumerate(targets) if failure_key(self.chainid, target) in known_failures]
+            # Without `tryBlockAndAggregate`, a batch of nothing but suspects is sent as is and bisected if it reverts.
+            if suspects and (len(suspects) < len(targets) or self.can_try):
+                return await self.fetch_with_suspects(targets, suspects, ConnErr_retries, id)
+        try:
+            outputs = await self.fetch_aggregate(targets)
+            self.batcher.record_success(targets)
             return outputs
         except Exception as e:
-            _raise_or_proceed(e, len(calls), ConnErr_retries=ConnErr_retries)
+            if self.isolate_failures and is_revert(e):
+                return await self.isolate(targets, id)
+            _raise_or_proceed(e, len(targets), ConnErr_retries=ConnErr_retries)
         
         # Failed, we need to rebatch the calls and try again.
         batch_results = await gather([
-            self.fetch_outputs(chunk, ConnErr_retries+1, f"{id}_{i}")
-            for i, chunk in enumerate(await batcher.rebatch(calls))
+            self.fetch_raw_outputs(chunk, ConnErr_retries+1, f"{id}_{i}")
+            for i, chunk in enumerate(await self.batcher.rebatch(targets))
         ])
-            
-        return_val = await run_in_subprocess(unpack_batch_results,batch_results)
-        logger.debug(f"coroutine {id} finished")
-        return return_val
+        return unpack_batch_results(batch_results)
+
+    @property
+    def can_try(self) -> bool:
+        """ Whether calls can be sent so that failures don't revert the batch, with `aggregate3`, `tryBlockAndAggregate` or deployless. """
+        return self.v3 or self.deployless or bool(MULTICALL2_ADDRESSES.get(self.chainid))
+
+    async def isolate(self, targets: List[Target], id: str = '') -> List[CallResponse]:
+        """
+        Finds the calls that made an aggregate of `targets` revert and returns the outputs of the others, with `(False, b'')` for failures.
+        The batch is sent again with `tryBlockAndAggregate`, or bisected on chains without Multicall2, in O(failures * log(calls)) requests.
+        Failing calls are remembered in `known_failures`.
+        """
+        if self.can_try:
+            outputs = await self.fetch_tolerant(targets, id)
+        elif len(targets) == 1:
+            outputs = [(False, b'')]
+        else:
+            outputs = unpack_batch_results(await gather([
+                self.fetch_raw_outputs(half, 0, f"{id}_{i}")
+                for i, half in enumerate(self.batcher.split_calls(targets))
+            ]))
+        failed = [
+            failure_key(self.chainid, target)
+            for target, (success, _) in zip(targets, outputs)
+            if success is False and not self.allows_failure(target)
+        ]
+        if failed:
+            logger.info(f"coroutine {id}: {len(failed)} of {len(targets)} calls reverted")
+            known_failures.update(failed)
+        return outputs
+
+    async def fetch_with_suspects(self, targets: List[Target], suspects: List[int], ConnErr_retries: int = 0, id: str = '') -> List[CallResponse]:
+        """ Sends the calls at `suspects`, which failed before, separately so they can't make the rest of `targets` revert. """
+        suspect_set = set(suspects)
+        others = [i for i in range(len(targets)) if i not in suspect_set]
+        coroutines = [self.fetch_tolerant([targets[i] for i in suspects], f"{id}_suspects")]
+        if others:
+            coroutines.append(self.fetch_raw_outputs([targets[i] for i in others], ConnErr_retries, id))
+        outputs: List[CallResponse] = [None] * len(targets) # type: ignore
+        for indexes, batch in zip((suspects, others), await gather(coroutines)):
+            for i, output in zip(indexes, batch):
+                outputs[i] = output
+        return outputs
+
+    async def fetch_tolerant(self, targets: List[Target], id: str = '') -> List[CallResponse]:
+        """ Fetches `targets` with `tryBlockAndAggregate` where possible, so failing calls don't revert the others. """
+        if not self.can_try:
+            return await self.fetch_raw_outputs(targets, 0, id)
+        tolerant = Multicall(
+            [], self.block_id, require_success=False, gas_limit=self.gas_limit, _w3=self.w3,
+            batcher=self.batcher, priority=self.priority, deployless=self.deployless,
+        )
+        outputs = await tolerant.fetch_raw_outputs(targets, 0, id)
+        # Successful outputs of strict calls are passed on like `aggregate` outputs, so `returns` handlers get the value alone.
+        return [
+            (False if not success else True if self.allows_failure(target) else None, output)
+            for target, (success, output) in zip(targets, outputs)
+        ]
+
+    async def fetch_aggregate(self, targets: Sequence[Target]) -> Sequence[CallResponse]:
+        """
+        Sends one batch through the multicall contract and returns the raw output of each call.
+        The envelope is encoded and decoded here with `multicall.envelope`, it isn't worth a round trip to a worker process.
+        """
+        return self.mark_outputs(targets, await self.send_aggregate(self.encode_aggregate(targets)))
+
+    def encode_aggregate(self, targets: Sequence[Target]) -> bytes:
+        if self.deployless:
+            return encode_deployless(targets, [self.allows_failure(target) for target in targets])
+        fourbyte = get_signature(self.multicall_sig).fourbyte
+        if self.v3:
+            return encode_aggregate3(fourbyte, targets, [self.allows_failure(target) for target in targets])
+        if self.require_success is True:
+            return encode_aggregate(fourbyte, targets)
+        return encode_aggregate(fourbyte, targets, self.require_success)
+
+    @eth_retry.auto_retry
+    async def send_aggregate(self, calldata: bytes) -> Sequence[CallResponse]:
+        """ Sends aggregate calldata from `encode_aggregate` at `self.block_id` and returns the raw output of each call. """
+        if self.deployless:
+            if len(calldata) > MAX_INITCODE_BYTES:
+                raise PayloadTooLarge(f'Deployless multicall of {len(calldata)} bytes is larger than the {MAX_INITCODE_BYTES} bytes initcode can be.')
+            args = [{'data': calldata, 'gas': self.gas_limit}, self.block_identifier]
+        else:
+            aggregate = self.aggregate
+            args = prep_calldata_args(aggregate.target, calldata, self.block_identifier, self.gas_limit, aggregate.state_override_code)
+        output = await eth_call(self.w3, args, self.priority)
+
+        if self.deployless:
+            return decode_deployless(output)
+        if self.v3:
+            return decode_aggregate3(output)
+        if self.require_success is True:
+            _, outputs = decode_aggregate(output)
+            return unpack_aggregate_outputs(outputs)
+        _, _, outputs = decode_try_block_and_aggregate(output)
+        return outputs
+
+    async def decode_outputs(self, calls: List[Call], outputs: Sequence[CallResponse]) -> List[Any]:
+        """ Decodes a batch of outputs and applies each call's `returns` to its value. """
+        values = await self.decode_values(calls, outputs)
+        return [
+            apply_returns(value, call.returns, value is not None if self.call_allows_failure(call) else None)
+            for call, value in zip(calls, values)
+        ]
+
+    async def decode_values(self, calls: List[Call], outputs: Sequence[CallResponse]) -> List[Any]:
+        """
+        Decodes a batch of outputs with as few subprocess round trips as possible, None for calls that failed.
+        Each distinct signature is sent once per chunk. `returns` handlers are applied by the caller, so they are never pickled.
+        """
+        signatures: List[Signature] = []
+        signature_ids: List[int] = []
+        ids: Dict[str,int] = {}
+        for call in calls:
+            if call.signature.signature not in ids:
+                ids[call.signature.signature] = len(signatures)
+                signatures.append(call.signature)
+            signature_ids.append(ids[call.signature.signature])
+
+        if NUM_PROCESSES > 1:
+            # memoryviews into the aggregate response can't be pickled
+            outputs = [(success, bytes(output)) for success, output in outputs]
+
+        chunk_size = max(-(-len(calls) // NUM_PROCESSES), MIN_DECODE_CHUNK)
+        return unpack_batch_results(await gather([
+            run_in_subprocess(decode_batch, signatures, signature_ids[i:i+chunk_size], outputs[i:i+chunk_size])
+            for i in range(0, len(calls), chunk_size)
+        ]))
 
     @property
     def aggregate(self) -> Call:
@@ -113,7 +610,7 @@ class Multicall:
                 _w3=self.w3,
                 block_id=self.block_id,
                 gas_limit=self.gas_limit,
-                state_override_code=MULTICALL2_BYTECODE
+                state_override_code=MULTICALL3_BYTECODE if self.v3 else MULTICALL2_BYTECODE
             )
         
         # If state override is not supported, we simply skip it.
@@ -172,9 +669,130 @@ class NotSoBrightBatcher:
             self.step = new_step
         return await run_in_subprocess(self.split_calls, calls, self.step)
 
+    def record_success(self, calls: List[Call]) -> None:
+        """ `NotSoBrightBatcher` only ever shrinks `self.step`, so there is nothing to do here. """
 
+
+class AdaptiveBatcher(NotSoBrightBatcher):
+    """
+    Batch size controller for a single rpc endpoint.
+    Batches are cut at `step` calls, `max_bytes` bytes of encoded calldata or `max_gas` estimated gas, whichever comes first.
+    `step` grows by `increase` each time a full batch succeeds and is multiplied by `decrease` each time a batch fails,
+    so the batch size recovers after a transient failure instead of staying small forever.
+    """
+    def __init__(
+        self,
+        step: int = 10_000,
+        min_step: int = 1,
+        max_step: int = 100_000,
+        increase: int = 100,
+        decrease: float = 0.5,
+        max_bytes: int = MAX_CALLDATA_BYTES,
+        max_gas: int = GAS_LIMIT,
+        gas_per_call: int = CALL_GAS_ESTIMATE,
+    ) -> None:
+        self.step = step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.increase = increase
+        self.decrease = decrease
+        self.max_bytes = max_bytes
+        self.max_gas = max_gas
+        self.gas_per_call = gas_per_call
+
+    def estimate_bytes(self, data: bytes) -> int:
+        """
+        Size of a call inside the encoded `(address,bool,bytes)[]` array of `aggregate3`: tuple offset, address, allowFailure,
+        bytes offset, length and padded data. The `(address,bytes)[]` of older multicall contracts is a word smaller.
+        """
+        return 160 + -(-len(data) // 32) * 32
+
+    def estimate_gas(self, target: bytes, data: bytes) -> int:
+        """ The gas learned for the call's target and selector if there is a gas profile, `gas_per_call` otherwise. """
+        profile = get_gas_profile()
+        gas = profile.estimate(target, data) if profile is not None else None
+        return self.gas_per_call if gas is None else gas
+
+    def batch_calls(self, calls: List[Call], step: Optional[int] = None) -> List[List[Call]]:
+        '''
+        Batch calls into chunks of at most `step` calls, `self.max_bytes` calldata bytes and `self.max_gas` estimated gas.
+        '''
+        ranges = self.batch_ranges(
+            [self.estimate_bytes(call.data) for call in calls],
+            [self.estimate_gas(call.target_bytes, call.data) for call in calls],
+            step,
+        )
+        return [calls[batch.start:batch.stop] for batch in ranges]
+
+    def batch_ranges(self, sizes: Sequence[int], gases: Sequence[int], step: Optional[int] = None) -> List[range]:
+        '''
+        Cuts calls with the given estimated sizes and gas costs into consecutive batches, returned as ranges of indexes.
+        '''
+        step = step or self.step
+        batches = []
+        start = ct_bytes = ct_gas = 0
+        for i, (call_bytes, call_gas) in enumerate(zip(sizes, gases)):
+            if i > start and (i - start >= step or ct_bytes + call_bytes > self.max_bytes or ct_gas + call_gas > self.max_gas):
+                batches.append(range(start, i))
+                start, ct_bytes, ct_gas = i, 0, 0
+            ct_bytes += call_bytes
+            ct_gas += call_gas
+        batches.append(range(start, len(sizes)))
+        return batches
+
+    async def rebatch(self, calls: List[Any]) -> List[List[Any]]:
+        self.record_failure(calls)
+        # These calls already fit within the byte and gas limits together, so we only need to look at `step`.
+        if len(calls) > self.step:
+            return [calls[i:i+self.step] for i in range(0, len(calls), self.step)]
+        return list(self.split_calls(calls))
+
+    def record_success(self, calls: List[Call]) -> None:
+        """ Additive increase, only when `step` was what limited the batch. """
+        if len(calls) >= self.step and self.step < self.max_step:
+            self.step = min(self.step + self.increase, self.max_step)
+
+    def record_failure(self, calls: List[Call]) -> None:
+        """ Multiplicative decrease. """
+        # A batch larger than `step` was cut before an earlier decrease, we don't want to shrink twice for the same failure.
+        if len(calls) > self.step:
+            return
+        new_step = max(self.min_step, int(len(calls) * self.decrease))
+        if new_step < self.step:
+            logger.warning(f'Multicall batch size reduced from {self.step} to {new_step}. The failed batch had {len(calls)} calls.')
+            self.step = new_step
+
+
+# NOTE: `Multicall` no longer uses this module-level batcher, it is kept for backwards compatibility.
 batcher = NotSoBrightBatcher()
 
+batchers: Dict[Tuple[str,int,bool],AdaptiveBatcher] = {}
+
+def get_batcher(w3: Web3, deployless: bool = False) -> AdaptiveBatcher:
+    '''
+    Returns the `AdaptiveBatcher` for `w3`'s endpoint and chain. Each rpc backend converges on its own batch size.
+    Deployless multicalls get their own, with batches cut to fit in initcode, so their failures don't shrink the others' batches.
+    '''
+    key = get_endpoint(w3), chain_id(w3), deployless
+    if key not in batchers:
+        if deployless:
+            batchers[key] = AdaptiveBatcher(max_bytes=min(MAX_CALLDATA_BYTES, MAX_INITCODE_BYTES - len(DEPLOYLESS_INITCODE)))
+        else:
+            batchers[key] = AdaptiveBatcher()
+    return batchers[key]
+
+
+def is_revert(e: Exception) -> bool:
+    """ Whether `e` means the aggregate call reverted, as opposed to the node failing to run it. """
+    if is_code_size_error(e):
+        return False
+    if isinstance(e, ContractLogicError):
+        return True
+    return isinstance(e, ValueError) and 'revert' in str(e).lower() and 'out of gas' not in str(e).lower()
+
+def is_code_size_error(e: Exception) -> bool:
+    """ Whether `e` means the outputs of a deployless multicall were too big to be returned as contract code. """
+    return isinstance(e, ValueError) and 'code size' in str(e).lower()
 
 def _raise_or_proceed(e: Exception, ct_calls: int, ConnErr_retries: int) -> None:
     """ Depending on the exception, either raises or ignores and allows `batcher` to rebatch. """
@@ -197,8 +815,12 @@ def _raise_or_proceed(e: Exception, ct_calls: int, ConnErr_retries: int) -> None
         logger.warning(e)
     elif isinstance(e, asyncio.TimeoutError):
         pass
+    elif isinstance(e, PayloadTooLarge):
+        if ct_calls == 1:
+            raise e
+        logger.warning(e)
     elif isinstance(e, ValueError):
-        if 'out of gas' not in str(e).lower():
+        if 'out of gas' not in str(e).lower() and not is_code_size_error(e):
             raise e
         if ct_calls == 1:
             raise e
@@ -0,0 +1,333 @@
+"""
+Async providers that keep one connection open to the node, over IPC or a websocket.
+
+Requests are pipelined: each one is written as soon as it is made and responses are matched back by id, in whatever order they come.
+If the connection drops, it is opened again and the requests still waiting for a response are sent again.
+Notifications of `eth_subscribe` subscriptions are passed to whoever is iterating over `PersistentProvider.subscribe`.
+`get_async_w3` uses these for `Web3`s with an `IPCProvider` or a `WebsocketProvider`.
+"""
+
+import asyncio
+import codecs
+from abc import ABC, abstractmethod
+import itertools
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from weakref import WeakKeyDictionary
+
+from aiohttp import WSMsgType
+from web3._utils.encoding import Web3JsonEncoder
+from web3.providers.async_base import AsyncBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from multicall.constants import PERSISTENT_RECONNECTS
+from multicall.loggers import setup_logger
+from multicall.session import get_session
+
+logger = setup_logger(__name__)
+
+
+class Connection(ABC):
+    """ One persistent connection on one event loop. Subclasses open it and read and write the messages. """
+    def __init__(self, endpoint: str, max_reconnects: int = PERSISTENT_RECONNECTS) -> None:
+        self.endpoint = endpoint
+        self.max_reconnects = max_reconnects
+        self.ids = itertools.count()
+        # id: (payload, future) for every request still waiting for its response
+        self.pending: Dict[int,Tuple[bytes,asyncio.Future]] = {}
+        # subscription id: queue of its notifications
+        self.subscriptions: Dict[str,asyncio.Queue] = {}
+        # ids of the `eth_subscribe` requests waiting for their response
+        self.subscribing: Set[int] = set()
+        self.reader: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self.reader is not None and not self.reader.done()
+
+    async def request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        id = next(self.ids)
+        payload = json.dumps({'jsonrpc': '2.0', 'id': id, 'method': method, 'params': params}, cls=Web3JsonEncoder).encode()
+        future = asyncio.get_event_loop().create_future()
+        self.pending[id] = payload, future
+        if method == 'eth_subscribe':
+            self.subscribing.add(id)
+        try:
+            await self.ensure_connected()
+            try:
+                await self.write(payload)
+            except Exception as e:
+                # The reader notices too and sends everything pending again once it has reconnected.
+                logger.debug(f'{self.endpoint}: write failed, waiting for reconnect: {e!r}')
+            return await future
+        finally:
+            self.pending.pop(id, None)
+            self.subscribing.discard(id)
+
+    async def ensure_connected(self) -> None:
+        async with self.lock:
+            if not self.connected:
+                await self.connect()
+                self.reader = asyncio.ensure_future(self.read_forever())
+
+    async def read_forever(self) -> None:
+        reconnects = 0
+        while True:
+            try:
+                async for message in self.messages():
+                    reconnects = 0
+                    self.dispatch(message)
+                error: Exception = ConnectionError(f'{self.endpoint} closed the connection')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            await self.close()
+            # Subscriptions don't survive the connection, whoever is listening has to subscribe again.
+            for queue in self.subscriptions.values():
+                queue.put_nowait(ConnectionError(f'Lost connection to {self.endpoint}: {error!r}'))
+            self.subscriptions.clear()
+            if not self.pending:
+                # Nobody is waiting, the next request will connect again.
+                return
+            reconnects += 1
+            if reconnects > self.max_reconnects:
+                logger.warning(f'{self.endpoint}: giving up after {self.max_reconnects} reconnects: {error!r}')
+                for _, future in self.pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError(f'Lost connection to {self.endpoint}: {error!r}'))
+                return
+            logger.warning(f'{self.endpoint}: connection lost, reconnecting: {error!r}')
+            await asyncio.sleep(min(0.1 * 2 ** (reconnects - 1), 5))
+            try:
+                await self.connect()
+                for payload, _ in list(self.pending.values()):
+                    await self.write(payload)
+            except Exception as e:
+                logger.debug(f'{self.endpoint}: reconnect failed: {e!r}')
+
+    async def disconnect(self) -> None:
+        if self.reader is not None:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            self.reader = None
+        await self.close()
+
+    async def subscribe(self, params: Any) -> Tuple[str,asyncio.Queue]:
+        """ Sends `eth_subscribe` and returns the subscription id and the queue its notifications are put in. """
+        response = await self.request(RPCEndpoint('eth_subscribe'), params)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result'], self.subscriptions[response['result']]
+
+    async def unsubscribe(self, id: str) -> None:
+        if self.subscriptions.pop(id, None) is None or not self.connected:
+            return
+        try:
+            await asyncio.wait_for(self.request(RPCEndpoint('eth_unsubscribe'), [id]), 5)
+        except Exception as e:
+            logger.debug(f'{self.endpoint}: unsubscribe failed: {e!r}')
+
+    def dispatch(self, message: Any) -> None:
+        for response in message if isinstance(message, list) else [message]:
+            if not isinstance(response, dict):
+                continue
+            if response.get('method') == 'eth_subscription':
+                queue = self.subscriptions.get(response['params']['subscription'])
+                if queue is not None:
+                    queue.put_nowait(response['params']['result'])
+                continue
+            if 'id' not in response:
+                continue
+            if response['id'] in self.subscribing and 'result' in response:
+                # Notifications can come right behind the response, they need somewhere to go before `subscribe` gets to run.
+                self.subscriptions[response['result']] = asyncio.Queue()
+            _, future = self.pending.get(response['id'], (None, None))
+            if future is not None and not future.done():
+                future.set_result(response)
+
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+    @abstractmethod
+    async def write(self, payload: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def messages(self) -> AsyncIterator[Any]:
+        """ Yields each json message the node sends until the connection is closed. """
+
+
+# The next quote or bracket outside of a string, and the rest of a string up to its closing quote or a backslash at the very end.
+STRUCTURE = re.compile(r'["{}\[\]]')
+STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+
+
+class JSONStream:
+    """
+    Splits a stream of json objects and arrays into messages. Brackets outside of strings are counted as the text comes in,
+    so each message is joined and parsed once, when its last bracket is in, however many reads it takes.
+    """
+    def __init__(self) -> None:
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        # The text of the message in progress, one part per read.
+        self.parts: List[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """ Returns the messages completed by `chunk`. """
+        text = self.utf8.decode(chunk)
+        messages = []
+        position = 0
+        while position < len(text):
+            if self.in_string:
+                if self.escaped:
+                    position += 1
+                    self.escaped = False
+                    continue
+                position = STRING_REST.match(text, position).end()
+                if position == len(text):
+                    break
+                if text[position] == '\\':
+                    # The escaped character is in the next read.
+                    self.escaped = True
+                else:
+                    self.in_string = False
+                position += 1
+                continue
+            match = STRUCTURE.search(text, position)
+            if match is None:
+                break
+            position = match.end()
+            character = match.group()
+            if character == '"':
+                self.in_string = True
+            elif character in '{[':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    messages.append(json.loads(''.join(self.parts) + text[:position]))
+                    self.parts = []
+                    text, position = text[position:], 0
+        if text.strip() or self.parts:
+            self.parts.append(text)
+        return messages
+
+
+class IPCConnection(Connection):
+    # The largest response we can read, multicall responses can get big.
+    READ_LIMIT = 2 ** 30
+
+    async def connect(self) -> None:
+        self.stream_reader, self.stream_writer = await asyncio.open_unix_connection(self.endpoint, limit=self.READ_LIMIT)
+
+    async def close(self) -> None:
+        writer = getattr(self, 'stream_writer', None)
+        if writer is not None:
+            writer.close()
+
+    async def write(self, payload: bytes) -> None:
+        if self.stream_writer.is_closing():
+            raise ConnectionError(f'{self.endpoint} is closed')
+        self.stream_writer.write(payload)
+        await self.stream_writer.drain()
+
+    async def messages(self) -> AsyncIterator[Any]:
+        # IPC is a plain stream of json values, which may or may not be separated by whitespace.
+        stream = JSONStream()
+        while True:
+            chunk = await self.stream_reader.read(2 ** 20)
+            if not chunk:
+                return
+            for message in stream.feed(chunk):
+                yield message
+
+
+class WebsocketConnection(Connection):
+    async def connect(self) -> None:
+        self.websocket = await get_session().ws_connect(self.endpoint, max_msg_size=0, heartbeat=30)
+
+    async def close(self) -> None:
+        websocket = getattr(self, 'websocket', None)
+        if websocket is not None:
+            await websocket.close()
+
+    async def write(self, payload: bytes) -> None:
+        await self.websocket.send_str(payload.decode())
+
+    async def messages(self) -> AsyncIterator[Any]:
+        async for message in self.websocket:
+            if message.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                yield json.loads(message.data)
+            elif message.type == WSMsgType.ERROR:
+                raise self.websocket.exception()
+
+
+class PersistentProvider(AsyncBaseProvider):
+    """ Keeps one `connection_class` connection to `endpoint_uri` open on each event loop. """
+    connection_class = Connection
+
+    def __init__(self, endpoint_uri: str, max_reconnects: int = PERSISTENT_RECONNECTS) -> None:
+        super().__init__()
+        self.endpoint_uri = endpoint_uri
+        self.max_reconnects = max_reconnects
+        self.connections: "WeakKeyDictionary[asyncio.AbstractEventLoop,Connection]" = WeakKeyDictionary()
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__} {self.endpoint_uri}>'
+
+    def connection(self) -> Connection:
+        loop = asyncio.get_event_loop()
+        if loop not in self.connections:
+            self.connections[loop] = self.connection_class(self.endpoint_uri, self.max_reconnects)
+        return self.connections[loop]
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return await self.connection().request(method, params)
+
+    async def subscribe(self, params: Any) -> AsyncIterator[Any]:
+        """ Yields each notification of an `eth_subscribe` with `params`. Raises ConnectionError if the connection is lost. """
+        connection = self.connection()
+        id, queue = await connection.subscribe(params)
+        try:
+            while True:
+                notification = await queue.get()
+                if isinstance(notification, Exception):
+                    raise notification
+                yield notification
+        finally:
+            await connection.unsubscribe(id)
+
+    async def disconnect(self) -> None:
+        """ Closes the connection for the running event loop. The next request opens a new one. """
+        connection = self.connections.pop(asyncio.get_event_loop(), None)
+        if connection is not None:
+            await connection.disconnect()
+
+    async def isConnected(self) -> bool:
+        try:
+            await self.connection().ensure_connected()
+            return True
+        except OSError:
+            return False
+
+
+class AsyncIPCProvider(PersistentProvider):
+    connection_class = IPCConnection
+
+
+class AsyncWebsocketProvider(PersistentProvider):
+    connection_class = WebsocketConnection
@@ -0,0 +1,230 @@
+"""
+Spreads requests over several rpc endpoints serving the same chain.
+
+Use `Web3(HTTPProviderPool([...]))` as `_w3` for `Multicall` and `Call`. Sync requests go through `HTTPProviderPool` itself,
+`get_async_w3` pairs it with an `AsyncHTTPProviderPool` that shares its endpoint stats.
+"""
+
+import asyncio
+import threading
+from time import monotonic
+from typing import Any, List, Optional, Sequence, Union
+
+from web3 import HTTPProvider
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from multicall.constants import AIOHTTP_TIMEOUT
+from multicall.exceptions import PayloadTooLarge
+from multicall.loggers import setup_logger
+from multicall.session import SessionHTTPProvider
+
+logger = setup_logger(__name__)
+
+
+class Endpoint:
+    """
+    An rpc endpoint in a pool.
+    `max_in_flight` limits the requests sent to it at once and `max_bytes` the size of the calldata it accepts, 0 for no limit.
+    """
+    def __init__(self, url: str, max_in_flight: int = 0, max_bytes: int = 0) -> None:
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.max_bytes = max_bytes
+        # Exponentially weighted moving average of the response time in seconds, None until the first response.
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def __repr__(self) -> str:
+        return f'<Endpoint {self.url} latency={self.latency} in_flight={self.in_flight} failures={self.failures}>'
+
+    def score(self) -> float:
+        # Endpoints we haven't heard from yet score 0, so every endpoint gets tried.
+        return (self.latency or 0) * (self.in_flight + 1)
+
+    def fits(self, size: int) -> bool:
+        return not self.max_bytes or size <= self.max_bytes
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now and (not self.max_in_flight or self.in_flight < self.max_in_flight)
+
+
+def request_size(method: RPCEndpoint, params: Any) -> int:
+    """ Size of the calldata of an eth_call, 0 for everything else. """
+    if method != 'eth_call' or not params or not isinstance(params[0], dict):
+        return 0
+    data = params[0].get('data') or b''
+    return (len(data) - 2) // 2 if isinstance(data, str) else len(data)
+
+
+class HTTPProviderPool(BaseProvider):
+    """
+    Routes each request to the endpoint with the lowest latency weighted by requests in flight.
+    Failed requests are retried on the next best endpoint. After `max_failures` failures in a row, an endpoint is left out
+    for `cooldown` seconds, then given another chance. Latency is averaged with weight `alpha` for the newest response.
+    With `hedge`, async requests that take more than `hedge_factor` times the endpoint's average latency,
+    and at least `hedge_min_delay` seconds, are also sent to a second endpoint and the first response wins.
+    """
+    def __init__(
+        self,
+        endpoints: Sequence[Union[str,Endpoint]],
+        alpha: float = 0.3,
+        max_failures: int = 3,
+        cooldown: float = 30.0,
+        hedge: bool = False,
+        hedge_factor: float = 3.0,
+        hedge_min_delay: float = 0.25,
+        request_kwargs: Optional[Any] = None,
+    ) -> None:
+        if not endpoints:
+            raise ValueError('A pool needs at least one endpoint.')
+        self.endpoints = [endpoint if isinstance(endpoint, Endpoint) else Endpoint(endpoint) for endpoint in endpoints]
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_factor = hedge_factor
+        self.hedge_min_delay = hedge_min_delay
+        # Identifies the pool wherever multicall keys state by endpoint, like batchers and schedulers.
+        self.endpoint_uri = 'pool:' + ','.join(endpoint.url for endpoint in self.endpoints)
+        self.providers = {endpoint.url: HTTPProvider(endpoint.url, request_kwargs) for endpoint in self.endpoints}
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'<HTTPProviderPool {[endpoint.url for endpoint in self.endpoints]}>'
+
+    def choose(self, size: int = 0, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        """
+        Returns the best endpoint for a request with `size` bytes of calldata that isn't in `exclude`,
+        preferring endpoints that aren't ejected or full. Returns None when every endpoint has been tried.
+        """
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.fits(size)]
+        if not candidates:
+            raise PayloadTooLarge(f'No endpoint in {self} accepts a request of {size} bytes.')
+        candidates = [endpoint for endpoint in candidates if endpoint not in exclude]
+        if not candidates:
+            return None
+        now = monotonic()
+        with self.lock:
+            available = [endpoint for endpoint in candidates if endpoint.available(now)]
+            if available:
+                return min(available, key=Endpoint.score)
+            # Everything is ejected or busy. Better to try the one coming back soonest than to fail.
+            return min(candidates, key=lambda endpoint: (endpoint.ejected_until, endpoint.score()))
+
+    def started(self, endpoint: Endpoint) -> float:
+        with self.lock:
+            endpoint.in_flight += 1
+        return monotonic()
+
+    def succeeded(self, endpoint: Endpoint, start: float) -> None:
+        elapsed = monotonic() - start
+        with self.lock:
+            endpoint.in_flight -= 1
+            endpoint.failures = 0
+            endpoint.ejected_until = 0.0
+            endpoint.latency = elapsed if endpoint.latency is None else self.alpha * elapsed + (1 - self.alpha) * endpoint.latency
+
+    def failed(self, endpoint: Endpoint, error: BaseException) -> None:
+        with self.lock:
+            endpoint.in_flight -= 1
+            endpoint.failures += 1
+            if endpoint.failures >= self.max_failures:
+                endpoint.ejected_until = monotonic() + self.cooldown
+                logger.warning(f'{endpoint.url} failed {endpoint.failures} times in a row, ejected for {self.cooldown}s: {error!r}')
+
+    def cancelled(self, endpoint: Endpoint) -> None:
+        with self.lock:
+            endpoint.in_flight -= 1
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        return max(self.hedge_min_delay, self.hedge_factor * (endpoint.latency or 0))
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        size = request_size(method, params)
+        tried: List[Endpoint] = []
+        error: Optional[Exception] = None
+        while True:
+            endpoint = self.choose(size, tried)
+            if endpoint is None:
+                raise error
+            tried.append(endpoint)
+            start = self.started(endpoint)
+            try:
+                response = self.providers[endpoint.url].make_request(method, params)
+            except Exception as e:
+                self.failed(endpoint, e)
+                error = e
+                continue
+            self.succeeded(endpoint, start)
+            return response
+
+    def isConnected(self) -> bool:
+        return any(provider.isConnected() for provider in self.providers.values())
+
+
+class AsyncHTTPProviderPool(AsyncBaseProvider):
+    """ The async side of an `HTTPProviderPool`, with the same endpoints and stats. """
+    def __init__(self, pool: HTTPProviderPool) -> None:
+        super().__init__()
+        self.pool = pool
+        self.endpoint_uri = pool.endpoint_uri
+        self._request_kwargs = {'timeout': AIOHTTP_TIMEOUT}
+        self.providers = {endpoint.url: SessionHTTPProvider(endpoint.url, self._request_kwargs) for endpoint in pool.endpoints}
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        size = request_size(method, params)
+        tried: List[Endpoint] = []
+        error: Optional[Exception] = None
+        while True:
+            endpoint = self.pool.choose(size, tried)
+            if endpoint is None:
+                raise error
+            tried.append(endpoint)
+            try:
+                return await self.hedged(endpoint, method, params, size, tried)
+            except Exception as e:
+                error = e
+
+    async def hedged(self, endpoint: Endpoint, method: RPCEndpoint, params: Any, size: int, tried: List[Endpoint]) -> RPCResponse:
+        first = asyncio.ensure_future(self.send(endpoint, method, params))
+        if not self.pool.hedge:
+            return await first
+        done, _ = await asyncio.wait([first], timeout=self.pool.hedge_delay(endpoint))
+        if done:
+            return first.result()
+        backup = self.pool.choose(size, tried)
+        if backup is None:
+            return await first
+        tried.append(backup)
+        logger.debug(f'{method} is slow on {endpoint.url}, hedging on {backup.url}')
+        second = asyncio.ensure_future(self.send(backup, method, params))
+        try:
+            for task in asyncio.as_completed([first, second]):
+                try:
+                    return await task
+                except Exception as e:
+                    error = e
+            raise error
+        finally:
+            first.cancel()
+            second.cancel()
+
+    async def send(self, endpoint: Endpoint, method: RPCEndpoint, params: Any) -> RPCResponse:
+        start = self.pool.started(endpoint)
+        try:
+            response = await self.providers[endpoint.url].make_request(method, params)
+        except asyncio.CancelledError:
+            self.pool.cancelled(endpoint)
+            raise
+        except Exception as e:
+            self.pool.failed(endpoint, e)
+            raise
+        self.pool.succeeded(endpoint, start)
+        return response
+
+    async def isConnected(self) -> bool:
+        return any([await provider.isConnected() for provider in self.providers.values()])
@@ -0,0 +1,132 @@
+import asyncio
+import heapq
+import itertools
+import threading
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Dict, List, Optional
+
+from web3 import Web3
+
+from multicall.constants import MAX_IN_FLIGHT, RATE_BURST, RATE_LIMIT
+from multicall.loggers import setup_logger
+from multicall.utils import get_endpoint
+
+logger = setup_logger(__name__)
+
+
+class Waiter:
+    __slots__ = 'sort_key', 'loop', 'future', 'granted', 'cancelled'
+
+    def __init__(self, priority: int, sequence: int, loop: asyncio.AbstractEventLoop) -> None:
+        # Higher priority first, then first come first served.
+        self.sort_key = -priority, sequence
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "Waiter") -> bool:
+        return self.sort_key < other.sort_key
+
+
+class Scheduler:
+    """
+    Limits the requests sent to a single rpc endpoint.
+    At most `max_in_flight` requests run at once, and with a `rate` they are started at most `rate` times per second,
+    with bursts of up to `burst`. When requests have to wait, higher `priority` goes first.
+    A limit of 0 disables it.
+
+    A scheduler is shared by every thread and event loop in the process, waiters are woken up on their own loop.
+    """
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, rate: float = RATE_LIMIT, burst: Optional[float] = None) -> None:
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst or RATE_BURST or max(rate, 1)
+        self.in_flight = 0
+        self.tokens = self.burst
+        self.updated = monotonic()
+        self.waiters: List[Waiter] = []
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    @asynccontextmanager
+    async def request(self, priority: int = 0) -> AsyncIterator[None]:
+        """ Waits for a free slot and a token, holds the slot until the block exits. """
+        await self.acquire(priority)
+        try:
+            await self.throttle()
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int = 0) -> None:
+        if not self.max_in_flight:
+            return
+        with self.lock:
+            if self.in_flight < self.max_in_flight and not self.waiters:
+                self.in_flight += 1
+                return
+            waiter = Waiter(priority, next(self.sequence), asyncio.get_event_loop())
+            heapq.heappush(self.waiters, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self.lock:
+                waiter.cancelled = True
+                granted = waiter.granted
+            # The slot was handed to us right before we were cancelled, pass it on.
+            if granted:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        if not self.max_in_flight:
+            return
+        with self.lock:
+            while self.waiters:
+                waiter = heapq.heappop(self.waiters)
+                if waiter.cancelled:
+                    continue
+                try:
+                    waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                except RuntimeError:
+                    # The waiter's loop was closed, it will never run.
+                    continue
+                # The slot goes straight to the waiter, `in_flight` stays the same.
+                waiter.granted = True
+                return
+            self.in_flight -= 1
+
+    async def throttle(self) -> None:
+        """ Takes a token from the bucket, sleeping until it has been refilled if it is empty. """
+        if not self.rate:
+            return
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens can go negative, which reserves the next ones for us so later callers queue up behind.
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+schedulers: Dict[str,Scheduler] = {}
+schedulers_lock = threading.Lock()
+
+def get_scheduler(w3: Web3) -> Scheduler:
+    '''
+    Returns the `Scheduler` for `w3`'s endpoint, shared by every `Multicall` and `Call` talking to it.
+    '''
+    endpoint = get_endpoint(w3)
+    with schedulers_lock:
+        if endpoint not in schedulers:
+            schedulers[endpoint] = Scheduler()
+        return schedulers[endpoint]
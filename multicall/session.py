@@ -0,0 +1,88 @@
+"""
+aiohttp sessions owned by multicall.
+
+Each event loop gets one session with a tuned connector, which every async request multicall makes on that loop shares,
+so connections are kept alive and reused between batches instead of being set up again.
+"""
+
+import asyncio
+import atexit
+import gzip
+from typing import Any, Dict, Optional
+from weakref import WeakKeyDictionary
+
+from aiohttp import ClientSession, TCPConnector
+from web3 import AsyncHTTPProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from multicall.constants import (AIOHTTP_TIMEOUT, CONNECTION_LIMIT,
+                                 CONNECTION_LIMIT_PER_HOST, DNS_CACHE_TTL,
+                                 GZIP_MIN_BYTES, KEEPALIVE_TIMEOUT)
+from multicall.loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+sessions: "WeakKeyDictionary[asyncio.AbstractEventLoop,ClientSession]" = WeakKeyDictionary()
+
+def get_session() -> ClientSession:
+    '''
+    Returns the session for the running event loop, creating it the first time.
+    A session is tied to the loop it was created on, so loops never share one.
+    '''
+    loop = asyncio.get_event_loop()
+    session = sessions.get(loop)
+    if session is None or session.closed:
+        connector = TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        session = sessions[loop] = ClientSession(connector=connector, timeout=AIOHTTP_TIMEOUT)
+    return session
+
+async def close_session() -> None:
+    '''
+    Closes the session for the running event loop. Call this before closing a loop you created yourself.
+    '''
+    session = sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
+
+@atexit.register
+def close_sessions() -> None:
+    """ Closes the sessions of loops that are still usable, so aiohttp doesn't warn about them on exit. """
+    for loop, session in list(sessions.items()):
+        if session.closed or loop.is_closed() or loop.is_running():
+            continue
+        try:
+            loop.run_until_complete(session.close())
+        except Exception as e:
+            logger.debug(f'Unable to close {session}: {e!r}')
+    sessions.clear()
+
+def compress(data: bytes, headers: Dict[str,str]) -> bytes:
+    """ Gzips request bodies of at least MULTICALL_GZIP_MIN_BYTES, if set. Only enable this for nodes that accept gzipped requests. """
+    if not GZIP_MIN_BYTES or len(data) < GZIP_MIN_BYTES:
+        return data
+    headers['Content-Encoding'] = 'gzip'
+    return gzip.compress(data, compresslevel=1)
+
+async def post(url: str, data: bytes, headers: Optional[Dict[str,str]] = None, **kwargs: Any) -> bytes:
+    '''
+    Posts `data` to `url` with the session for the running loop and returns the response body.
+    '''
+    headers = dict(headers or {'Content-Type': 'application/json'})
+    data = compress(data, headers)
+    async with get_session().post(url, data=data, headers=headers, **kwargs) as response:
+        response.raise_for_status()
+        return await response.read()
+
+
+class SessionHTTPProvider(AsyncHTTPProvider):
+    """ `AsyncHTTPProvider` that sends its requests through multicall's session for the running loop. """
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        kwargs = dict(self.get_request_kwargs())
+        raw_response = await post(self.endpoint_uri, request_data, **kwargs)
+        return self.decode_rpc_response(raw_response)
@@ -1,14 +1,35 @@
-from typing import Any, List, Optional, Tuple
+import re
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 
-# For eth_abi versions < 2.2.0, `decode` and `encode` have not yet been added.
+# For eth_abi versions < 2.2.0, `decode` has not yet been added.
 # As we require web3 ^5.27, we require eth_abi compatability with eth_abi v2.0.0b6 and greater.
 try:
-    from eth_abi import decode, encode
+    from eth_abi import decode
 except ImportError: 
-    from eth_abi import encode_abi as encode, decode_abi as decode
+    from eth_abi import decode_abi as decode
 
+from eth_abi.decoding import ContextFramesBytesIO, TupleDecoder
+from eth_abi.encoding import TupleEncoder
+from eth_abi.registry import registry
 from eth_typing.abi import Decodable, TypeStr
-from eth_utils import function_signature_to_4byte_selector
+from eth_utils import (function_signature_to_4byte_selector,
+                       to_checksum_address)
+
+WordDecoder = Callable[[bytes], Any]
+WordEncoder = Callable[[Any], bytes]
+
+# The number of distinct signatures, and of distinct type tuples, we keep parsed and compiled.
+SIGNATURE_CACHE_SIZE = 4096
+
+STATIC_TYPE = re.compile(r'^(uint|int|address|bool|bytes)(\d*)$')
+ZERO_WORD = bytes(32)
+
+# eth_abi v2 decodes addresses to lowercase, later versions checksum them. The fast path has to match.
+if decode(['address'], bytes(12) + b'\xff' * 20)[0] == '0x' + 'ff' * 20:
+    to_address = lambda raw: '0x' + raw.hex()
+else:
+    to_address = lambda raw: to_checksum_address(bytes(raw))
 
 
 def parse_signature(signature: str) -> Tuple[str, List[TypeStr], List[TypeStr]]:
@@ -54,14 +75,213 @@ def parse_typestring(typestring: str) -> Optional[List[TypeStr]]:
     return parts
 
 
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def get_tuple_encoder(types: Tuple[TypeStr,...]) -> TupleEncoder:
+    """ Same encoder `eth_abi.encode` builds on every call, built once per type tuple. """
+    return TupleEncoder(encoders=[registry.get_encoder(type_str) for type_str in types])
+
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def get_tuple_decoder(types: Tuple[TypeStr,...]) -> TupleDecoder:
+    """ Same decoder `eth_abi.decode` builds on every call, built once per type tuple. """
+    return TupleDecoder(decoders=[registry.get_decoder(type_str) for type_str in types])
+
+def word_decoder(type_str: TypeStr) -> Optional[WordDecoder]:
+    """
+    Returns a function that decodes a single 32 byte word of `type_str`, or None if `type_str` isn't a static elementary type.
+    The functions raise ValueError on anything eth_abi would reject, callers fall back to eth_abi to get its exception.
+    """
+    match = STATIC_TYPE.match(type_str)
+    if not match:
+        return None
+    base, size = match.group(1), match.group(2)
+
+    if base in ('uint', 'int'):
+        bits = int(size or 256)
+        if bits % 8 or not 8 <= bits <= 256:
+            return None
+        if base == 'uint':
+            if bits == 256:
+                return lambda word: int.from_bytes(word, 'big')
+            bound = 1 << bits
+            def decode_uint(word: bytes) -> int:
+                value = int.from_bytes(word, 'big')
+                if value >= bound:
+                    raise ValueError(f'{type_str} out of bounds')
+                return value
+            return decode_uint
+        bound = 1 << (bits - 1)
+        def decode_int(word: bytes) -> int:
+            value = int.from_bytes(word, 'big', signed=True)
+            if not -bound <= value < bound:
+                raise ValueError(f'{type_str} out of bounds')
+            return value
+        return decode_int
+
+    if base == 'address' and not size:
+        def decode_address(word: bytes) -> str:
+            if word[:12] != ZERO_WORD[:12]:
+                raise ValueError('address padding bytes were not empty')
+            return to_address(word[12:])
+        return decode_address
+
+    if base == 'bool' and not size:
+        def decode_bool(word: bytes) -> bool:
+            value = int.from_bytes(word, 'big')
+            if value > 1:
+                raise ValueError('bool must be either 0 or 1')
+            return value == 1
+        return decode_bool
+
+    if base == 'bytes' and size and 1 <= int(size) <= 32:
+        length = int(size)
+        def decode_bytes(word: bytes) -> bytes:
+            if word[length:] != ZERO_WORD[length:]:
+                raise ValueError(f'{type_str} padding bytes were not empty')
+            return bytes(word[:length])
+        return decode_bytes
+
+    return None
+
+def word_encoder(type_str: TypeStr) -> Optional[WordEncoder]:
+    """
+    Returns a function that encodes a value of `type_str` into a single 32 byte word, or None if `type_str` isn't a static elementary type.
+    The functions raise ValueError on anything eth_abi would reject, callers fall back to eth_abi to get its exception.
+    """
+    match = STATIC_TYPE.match(type_str)
+    if not match:
+        return None
+    base, size = match.group(1), match.group(2)
+
+    if base in ('uint', 'int'):
+        bits = int(size or 256)
+        if bits % 8 or not 8 <= bits <= 256:
+            return None
+        if base == 'uint':
+            bound = 1 << bits
+            def encode_uint(value: int) -> bytes:
+                if type(value) is not int or not 0 <= value < bound:
+                    raise ValueError(f'{value!r} is not a valid {type_str}')
+                return value.to_bytes(32, 'big')
+            return encode_uint
+        bound = 1 << (bits - 1)
+        def encode_int(value: int) -> bytes:
+            if type(value) is not int or not -bound <= value < bound:
+                raise ValueError(f'{value!r} is not a valid {type_str}')
+            return value.to_bytes(32, 'big', signed=True)
+        return encode_int
+
+    if base == 'address' and not size:
+        def encode_address(value: Any) -> bytes:
+            if isinstance(value, (bytes, bytearray)) and len(value) == 20:
+                return ZERO_WORD[:12] + value
+            if not isinstance(value, str) or len(value) not in (40, 42):
+                raise ValueError(f'{value!r} is not a valid address')
+            digits = value[-40:]
+            raw = bytes.fromhex(digits) if len(value) == 40 or value[:2] in ('0x', '0X') else b''
+            if len(raw) != 20:
+                raise ValueError(f'{value!r} is not a valid address')
+            # Mixed case has to be a valid checksum, like eth_abi checks.
+            if not digits.islower() and not digits.isupper() and to_checksum_address(raw)[2:] != digits:
+                raise ValueError(f'{value!r} is not a valid address')
+            return ZERO_WORD[:12] + raw
+        return encode_address
+
+    if base == 'bool' and not size:
+        def encode_bool(value: bool) -> bytes:
+            if type(value) is not bool:
+                raise ValueError(f'{value!r} is not a valid bool')
+            return ZERO_WORD[:31] + (b'\x01' if value else b'\x00')
+        return encode_bool
+
+    if base == 'bytes' and size and 1 <= int(size) <= 32:
+        length = int(size)
+        def encode_bytes(value: bytes) -> bytes:
+            if not isinstance(value, (bytes, bytearray)) or len(value) > length:
+                raise ValueError(f'{value!r} is not a valid {type_str}')
+            return bytes(value) + ZERO_WORD[len(value):]
+        return encode_bytes
+
+    return None
+
+
 class Signature:
     def __init__(self, signature: str) -> None:
         self.signature = signature
         self.function, self.input_types, self.output_types = parse_signature(signature)
         self.fourbyte = function_signature_to_4byte_selector(self.function)
+        decoders = [word_decoder(type_str) for type_str in self.output_types]
+        # Only set when every output type is static and elementary, the output is then a plain sequence of words.
+        self.word_decoders: Optional[List[Tuple[int,WordDecoder]]] = None
+        if all(decoders):
+            self.word_decoders = [(32 * i, decoder) for i, decoder in enumerate(decoders)]
+        encoders = [word_encoder(type_str) for type_str in self.input_types]
+        # Only set when every input type is static and elementary, the calldata is then the selector and one word per argument.
+        self.word_encoders: Optional[List[WordEncoder]] = encoders if all(encoders) else None
+
+    def __reduce__(self) -> Tuple[Callable[[str],"Signature"], Tuple[str]]:
+        # The word decoders are closures and can't be pickled, look the signature up on the other side instead.
+        return get_signature, (self.signature,)
 
     def encode_data(self, args: Optional[Any] = None) -> bytes:
-        return self.fourbyte + encode(self.input_types, args) if args else self.fourbyte
+        if not args:
+            return self.fourbyte
+        if self.word_encoders is not None and isinstance(args, (list, tuple)) and len(args) == len(self.word_encoders):
+            try:
+                return self.fourbyte + b''.join([encoder(arg) for encoder, arg in zip(self.word_encoders, args)])
+            except ValueError:
+                pass
+        return self.encode_abi(args)
+
+    def encode_abi(self, args: Any) -> bytes:
+        return self.fourbyte + get_tuple_encoder(tuple(self.input_types))(args)
 
     def decode_data(self, output: Decodable) -> Any:
-        return decode(self.output_types, output)
+        if self.word_decoders is not None:
+            try:
+                return self.decode_words(output)
+            except ValueError:
+                pass
+        return self.decode_abi(output)
+
+    def decode_abi(self, output: Decodable) -> Tuple[Any,...]:
+        return get_tuple_decoder(tuple(self.output_types))(ContextFramesBytesIO(bytes(output)))
+
+    def decode_many(self, outputs: Sequence[Decodable]) -> List[Union[Tuple[Any,...],Exception]]:
+        """
+        Decodes many outputs of this signature at once.
+        Each item in the result is either the decoded output or the exception raised while decoding it.
+        Outputs of static elementary types are read word by word straight from each buffer, everything else goes through eth_abi.
+        """
+        results: List[Union[Tuple[Any,...],Exception]] = []
+        append = results.append
+        if self.word_decoders is not None:
+            size = 32 * len(self.word_decoders)
+            single = self.word_decoders[0][1] if size == 32 else None
+        for output in outputs:
+            if self.word_decoders is not None and len(output) >= size:
+                try:
+                    if single:
+                        append((single(output[:32]),))
+                    else:
+                        append(tuple([decoder(output[offset:offset+32]) for offset, decoder in self.word_decoders]))
+                    continue
+                except ValueError:
+                    pass
+            try:
+                append(self.decode_abi(output))
+            except Exception as e:
+                append(e)
+        return results
+
+    def decode_words(self, output: Decodable) -> Tuple[Any,...]:
+        if len(output) < 32 * len(self.word_decoders):
+            raise ValueError('not enough data to decode')
+        return tuple([decoder(output[offset:offset+32]) for offset, decoder in self.word_decoders])
+
+
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def get_signature(signature: str) -> Signature:
+    """
+    Returns the shared `Signature` for `signature`, so calls with the same signature string only parse it and compute its selector once.
+    """
+    return Signature(signature)
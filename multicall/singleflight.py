@@ -0,0 +1,69 @@
+"""
+Coalesces identical requests that are in flight at the same time, so they share one round trip to the node.
+Futures belong to an event loop, so each loop has its own registry of requests in flight.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+from weakref import WeakKeyDictionary
+
+T = TypeVar('T')
+
+registries: "WeakKeyDictionary[asyncio.AbstractEventLoop,Dict[Hashable,asyncio.Future]]" = WeakKeyDictionary()
+
+def get_in_flight() -> Dict[Hashable,asyncio.Future]:
+    '''
+    Returns the requests in flight on the running event loop, keyed by whatever identifies them.
+    '''
+    loop = asyncio.get_event_loop()
+    if loop not in registries:
+        registries[loop] = {}
+    return registries[loop]
+
+def resolve(future: asyncio.Future, result: Any = None, exception: BaseException = None) -> None:
+    """ Hands the owner's result, exception or cancellation to everyone waiting on `future`. """
+    if future.done():
+        return
+    if isinstance(exception, asyncio.CancelledError):
+        future.cancel()
+    elif exception is not None:
+        future.set_exception(exception)
+        # Nobody might be waiting, we don't want asyncio to log it as never retrieved.
+        future.exception()
+    else:
+        future.set_result(result)
+
+async def wait_for(future: asyncio.Future) -> Any:
+    """
+    Waits for a request someone else is making.
+    Raises CancelledError if the owner was cancelled, check `future.cancelled()` to tell that apart from being cancelled yourself.
+    """
+    return await asyncio.shield(future)
+
+async def single_flight(key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+    '''
+    Returns the result of `fetch()`, or the result of the `fetch()` already running for `key`.
+    '''
+    in_flight = get_in_flight()
+    while key in in_flight:
+        future = in_flight[key]
+        try:
+            return await wait_for(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The owner was cancelled, not us. Try again, possibly as the new owner.
+
+    future = asyncio.get_event_loop().create_future()
+    in_flight[key] = future
+    try:
+        result = await fetch()
+    except BaseException as e:
+        resolve(future, exception=e)
+        raise
+    else:
+        resolve(future, result)
+        return result
+    finally:
+        if in_flight.get(key) is future:
+            del in_flight[key]
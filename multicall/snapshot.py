@@ -0,0 +1,75 @@
+"""
+Consistent reads across batches and multicalls.
+
+Without a `block_id`, each batch of a multicall resolves "latest" on its own and can read a different block than the others.
+Inside a `Snapshot`, every `Multicall` and `CallTable` created without a `block_id` reads the block the snapshot pinned.
+"""
+
+import contextvars
+from typing import Any, Dict, Optional, Union
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from multicall.constants import w3
+from multicall.utils import chain_id, get_async_w3
+
+BlockIdentifier = Union[int,str,Dict[str,Any]]
+
+current: "contextvars.ContextVar[Optional[Snapshot]]" = contextvars.ContextVar('snapshot', default=None)
+
+
+class Snapshot:
+    """
+    Pins one block for every multicall created in the context, with `with Snapshot():` or `async with Snapshot():`.
+    The block is looked up once when the context is entered, `block_number` and `block_hash` tell you which block the results are from.
+    With `by_hash`, requests name the block by its hash as in EIP-1898, so a reorg can't change what they read.
+    """
+    def __init__(self, block_id: Optional[Union[int,str]] = None, by_hash: bool = False, _w3: Web3 = w3) -> None:
+        self.block_id = 'latest' if block_id is None else block_id
+        self.by_hash = by_hash
+        self.w3 = _w3
+        self.chainid = chain_id(_w3)
+        self.block_number: Optional[int] = None
+        self.block_hash: Optional[HexBytes] = None
+        self.token: Optional[contextvars.Token] = None
+
+    def __repr__(self) -> str:
+        return f'<Snapshot of block {self.block_number}>'
+
+    @property
+    def block_identifier(self) -> BlockIdentifier:
+        """ The block to send with each `eth_call`. """
+        if self.by_hash:
+            return {'blockHash': self.block_hash.hex()}
+        return self.block_number
+
+    def pin(self, block: Any) -> None:
+        self.block_number = block['number']
+        self.block_hash = HexBytes(block['hash'])
+
+    def __enter__(self) -> "Snapshot":
+        self.pin(self.w3.eth.get_block(self.block_id))
+        self.token = current.set(self)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        current.reset(self.token)
+
+    async def __aenter__(self) -> "Snapshot":
+        self.pin(await get_async_w3(self.w3).eth.get_block(self.block_id))
+        self.token = current.set(self)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        current.reset(self.token)
+
+
+def get_snapshot(w3: Web3) -> Optional[Snapshot]:
+    '''
+    Returns the snapshot of the current context, if there is one for `w3`'s chain.
+    '''
+    snapshot = current.get()
+    if snapshot is None or snapshot.chainid != chain_id(w3):
+        return None
+    return snapshot
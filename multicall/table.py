@@ -0,0 +1,164 @@
+from array import array
+from time import time
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence, Union
+
+from web3 import Web3
+
+from multicall.constants import GAS_LIMIT, w3
+from multicall.envelope import AnyAddress, Target, canonical_address
+from multicall.gas import get_gas_profile
+from multicall.loggers import setup_logger
+from multicall.multicall import Multicall, NotSoBrightBatcher
+from multicall.signature import STATIC_TYPE, get_signature, word_decoder
+from multicall.template import CallTemplate
+from multicall.utils import await_awaitable, gather
+
+logger = setup_logger(__name__)
+
+Column = Union[array,List[Any]]
+
+
+class TableResult(NamedTuple):
+    # 1 for each call that succeeded and decoded, 0 otherwise.
+    success: bytearray
+    # One column per output type of the signature, with a row for each call.
+    columns: List[Column]
+
+
+def new_column(type_str: str, size: int) -> Column:
+    """
+    Numbers that fit in 64 bits and bools get a compact `array.array`, everything else a list.
+    Rows that failed are left at 0 in arrays and None in lists.
+    """
+    match = STATIC_TYPE.match(type_str)
+    if match:
+        base, bits = match.group(1), match.group(2)
+        if base == 'bool' and not bits:
+            return array('B', bytes(size))
+        if base in ('uint', 'int') and bits and int(bits) <= 64:
+            for typecode in ('B', 'H', 'I', 'Q'):
+                if int(bits) <= array(typecode).itemsize * 8:
+                    return array(typecode if base == 'uint' else typecode.lower(), bytes(array(typecode).itemsize * size))
+    return [None] * size
+
+
+class CallTable:
+    """
+    A columnar alternative to `Multicall` for calling one function many times.
+    Instead of `Call` objects and `returns` handlers, you pass a signature, the targets and the args of each call
+    and get back one column per output plus a success mask. Batching and transport are `Multicall`'s.
+    """
+    def __init__(
+        self,
+        function: str, # 'funcName(dtype)(dtype)'
+        targets: Union[AnyAddress,Sequence[AnyAddress]], # a single target for every call, or one per call
+        args: Optional[Sequence[Any]] = None, # a row of args per call, or a single value per call if the function takes one argument
+        block_id: Optional[int] = None,
+        require_success: bool = False,
+        gas_limit: int = GAS_LIMIT,
+        _w3: Web3 = w3,
+        batcher: Optional[NotSoBrightBatcher] = None,
+        priority: int = 0,
+        deployless: bool = False,
+    ) -> None:
+        self.signature = get_signature(function)
+        self.targets = targets
+        self.args = args
+        self.multicall = Multicall([], block_id, require_success, gas_limit, _w3, batcher, priority, deployless=deployless)
+
+        if isinstance(targets, (str, bytes)):
+            self.target_bytes: Optional[bytes] = canonical_address(targets)
+            self.size = len(args) if args is not None else 1
+        else:
+            self.target_bytes = None
+            self.size = len(targets)
+            if args is not None and len(args) != self.size:
+                raise ValueError(f'Got {len(targets)} targets but {len(args)} rows of args.')
+
+        input_types = self.signature.input_types
+        # Only a single elementary argument can be passed without wrapping it in a row.
+        self.wrap_args = len(input_types) == 1 and not input_types[0].endswith((']', ')'))
+        # With only static inputs every row has the same calldata size and we don't have to encode it to find out.
+        self.static_size: Optional[int] = None
+        if args is None or all(word_decoder(type_str) for type_str in input_types):
+            self.static_size = 4 + 32 * len(input_types) if args is not None else 4
+        # And their calldata is stamped out of a template instead of going through eth_abi row by row.
+        self.template = CallTemplate(function) if args is not None and self.signature.word_encoders is not None else None
+
+    def __repr__(self) -> str:
+        return f'<CallTable {self.signature.signature} x {self.size}>'
+
+    def __call__(self) -> TableResult:
+        start = time()
+        response = await_awaitable(self.coroutine())
+        logger.debug(f"CallTable took {time() - start}s")
+        return response
+
+    def target(self, i: int) -> bytes:
+        return self.target_bytes or canonical_address(self.targets[i])
+
+    def row(self, i: int) -> Sequence[Any]:
+        row = self.args[i]
+        if self.wrap_args and not isinstance(row, (list, tuple)):
+            row = [row]
+        return row
+
+    def calldata(self, i: int) -> bytes:
+        if self.args is None:
+            return self.signature.fourbyte
+        if self.template is not None:
+            return self.template.stamp(self.row(i))
+        return self.signature.encode_data(self.row(i))
+
+    def targets_for(self, rows: Iterable[int]) -> List[Target]:
+        if self.template is None:
+            return [(self.target(i), self.calldata(i)) for i in rows]
+        rows = list(rows)
+        if self.wrap_args and not any(isinstance(self.args[i], (list, tuple)) for i in rows):
+            calldata = self.template.stamp_column([self.args[i] for i in rows])
+        else:
+            calldata = self.template.stamp_rows([self.row(i) for i in rows])
+        return [(self.target(i), data) for i, data in zip(rows, calldata)]
+
+    async def coroutine(self) -> TableResult:
+        batcher = self.multicall.batcher
+        if get_gas_profile() is not None and self.size:
+            # One row per target is enough, they all call the same function.
+            rows = {self.target(i): i for i in reversed(range(self.size))} if self.target_bytes is None else {self.target_bytes: 0}
+            await self.multicall.measure_gas(self.targets_for(rows.values()))
+        if hasattr(batcher, 'batch_ranges'):
+            fourbyte = self.signature.fourbyte
+            batches = batcher.batch_ranges(
+                [batcher.estimate_bytes(bytes(self.static_size) if self.static_size else self.calldata(i)) for i in range(self.size)],
+                [batcher.estimate_gas(self.target(i), fourbyte) for i in range(self.size)],
+            )
+        else:
+            batches = [range(i, min(i + batcher.step, self.size)) for i in range(0, self.size, batcher.step)]
+
+        success = bytearray(self.size)
+        columns = [new_column(type_str, self.size) for type_str in self.signature.output_types]
+        await gather([self.fetch_rows(rows, success, columns, str(i)) for i, rows in enumerate(batches)])
+        return TableResult(success, columns)
+
+    async def fetch_rows(self, rows: range, success: bytearray, columns: List[Column], id: str = '') -> None:
+        """ Fetches the calls in `rows` and writes their decoded outputs straight into `success` and `columns`. """
+        outputs = await self.multicall.fetch_cached_outputs(self.targets_for(rows), id=id)
+        word_decoders = self.signature.word_decoders
+        for i, (ok, output) in zip(rows, outputs):
+            if ok is False:
+                continue
+            if word_decoders is not None and len(output) >= 32 * len(word_decoders):
+                try:
+                    values = [decoder(output[offset:offset+32]) for offset, decoder in word_decoders]
+                except ValueError:
+                    values = None
+            else:
+                values = None
+            if values is None:
+                try:
+                    values = self.signature.decode_abi(output)
+                except Exception:
+                    continue
+            for column, value in zip(columns, values):
+                column[i] = value
+            success[i] = 1
@@ -0,0 +1,75 @@
+"""
+Calldata for many calls to the same function.
+
+When every input of a function is a static elementary type, its calldata is the selector followed by one word per argument at fixed offsets.
+`CallTemplate` lays that buffer out once, then stamps out the calldata of each call by patching the words that change into a copy of it.
+"""
+
+from typing import Any, Iterable, List, Optional, Sequence
+
+from multicall.envelope import AnyAddress, Target, canonical_address
+from multicall.signature import get_signature, get_tuple_encoder
+
+
+class CallTemplate:
+    """
+    Stamps out calldata for `function`, which can only take static elementary arguments.
+    `args` fills in the first arguments, which every call shares unless they are patched over. The ones left out are zero.
+    """
+    def __init__(self, function: str, args: Optional[Sequence[Any]] = None) -> None:
+        self.signature = get_signature(function)
+        if self.signature.word_encoders is None:
+            raise ValueError(f'{function} takes arguments that are not static and elementary, it has no fixed calldata layout.')
+        self.encoders = self.signature.word_encoders
+        self.size = 4 + 32 * len(self.encoders)
+        if args is not None and len(args) > len(self.encoders):
+            raise ValueError(f'{function} takes {len(self.encoders)} arguments, got {len(args)}.')
+        self.buffer = bytearray(self.signature.fourbyte + bytes(self.size - 4))
+        for position, value in enumerate(args or []):
+            self.patch(self.buffer, position, value)
+
+    def __repr__(self) -> str:
+        return f'<CallTemplate {self.signature.function}>'
+
+    def encode_word(self, position: int, value: Any) -> bytes:
+        try:
+            return self.encoders[position](value)
+        except ValueError:
+            # eth_abi raises its usual exception, or encodes whatever the fast path was too strict about.
+            return get_tuple_encoder((self.signature.input_types[position],))([value])
+
+    def patch(self, buffer: bytearray, position: int, value: Any) -> None:
+        start = 4 + 32 * position
+        buffer[start:start + 32] = self.encode_word(position, value)
+
+    def stamp(self, row: Sequence[Any]) -> bytes:
+        """ Returns the calldata for a full row of args. """
+        return self.stamp_rows([row])[0]
+
+    def stamp_rows(self, rows: Iterable[Sequence[Any]]) -> List[bytes]:
+        """ Returns the calldata for each row of args, patched into a copy of the template. """
+        buffer = bytearray(self.buffer)
+        calldata = []
+        for row in rows:
+            if not isinstance(row, (list, tuple)) or len(row) != len(self.encoders):
+                # Same exception as encoding it any other way.
+                calldata.append(self.signature.encode_abi(row))
+                continue
+            for position, value in enumerate(row):
+                self.patch(buffer, position, value)
+            calldata.append(bytes(buffer))
+        return calldata
+
+    def stamp_column(self, values: Iterable[Any], position: int = 0) -> List[bytes]:
+        """ Returns the calldata for each of `values` as the argument at `position`, with the other arguments from the template. """
+        buffer = bytearray(self.buffer)
+        calldata = []
+        for value in values:
+            self.patch(buffer, position, value)
+            calldata.append(bytes(buffer))
+        return calldata
+
+    def targets(self, target: AnyAddress, values: Iterable[Any], position: int = 0) -> List[Target]:
+        """ Returns the `(target, calldata)` of each call in a sweep of `values` over one target, ready for `Multicall.encode_aggregate`. """
+        target_bytes = canonical_address(target)
+        return [(target_bytes, data) for data in self.stamp_column(values, position)]
@@ -0,0 +1,133 @@
+import asyncio
+import itertools
+import json
+from typing import Any, Dict, List, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from multicall.constants import RPC_BATCH, RPC_BATCH_BYTES, RPC_BATCH_SIZE
+from multicall.loggers import setup_logger
+from multicall.scheduler import get_scheduler
+from multicall.session import post
+from multicall.utils import get_async_w3, get_endpoint, set_result
+
+logger = setup_logger(__name__)
+
+# Set as the result of a batched request that has to be sent again on its own.
+RETRY = object()
+
+
+class Request(NamedTuple):
+    id: int
+    payload: bytes
+    priority: int
+    future: asyncio.Future
+
+
+def format_params(args: List[Any]) -> List[Any]:
+    """ Turns `prep_calldata_args` output into json-rpc params. """
+    tx = {
+        key: '0x' + value.hex() if isinstance(value, (bytes, bytearray)) else hex(value) if isinstance(value, int) else value
+        for key, value in args[0].items()
+    }
+    block_id = args[1]
+    if block_id is None:
+        block_id = 'latest'
+    elif isinstance(block_id, int):
+        block_id = hex(block_id)
+    return [tx, block_id, *args[2:]]
+
+
+class BatchTransport:
+    """
+    Packs the `eth_call`s started on one event loop for one endpoint into json-rpc batch requests.
+    Requests are collected until the loop runs out of other work, or until a batch reaches `max_size` requests or `max_bytes` bytes.
+    A batch takes a single slot from the endpoint's scheduler. Any request in it that doesn't come back with a result is sent again on its own.
+    """
+    def __init__(self, w3: Web3, max_size: int = RPC_BATCH_SIZE, max_bytes: int = RPC_BATCH_BYTES) -> None:
+        self.w3 = w3
+        self.endpoint = get_endpoint(w3)
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ids = itertools.count()
+        self.queue: List[Request] = []
+        self.queue_bytes = 0
+        self.handle: Optional[asyncio.Handle] = None
+
+    async def call(self, args: List[Any], priority: int = 0) -> Any:
+        loop = asyncio.get_event_loop()
+        id = next(self.ids)
+        payload = json.dumps({'jsonrpc': '2.0', 'id': id, 'method': 'eth_call', 'params': format_params(args)}).encode()
+        if self.queue and self.queue_bytes + len(payload) > self.max_bytes:
+            self.flush()
+        request = Request(id, payload, priority, loop.create_future())
+        self.queue.append(request)
+        self.queue_bytes += len(payload)
+        if len(self.queue) >= self.max_size:
+            self.flush()
+        elif self.handle is None:
+            # Everything else that is ready to run gets the chance to join the batch first.
+            self.handle = loop.call_soon(self.flush)
+        return await request.future
+
+    def flush(self) -> None:
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        requests, self.queue, self.queue_bytes = self.queue, [], 0
+        if len(requests) == 1:
+            # Not worth a batch, send it the usual way.
+            set_result(requests[0].future, RETRY)
+        elif requests:
+            asyncio.ensure_future(self.send(requests))
+
+    async def send(self, requests: List[Request]) -> None:
+        results: Dict[int,Any] = {}
+        try:
+            body = b'[' + b','.join(request.payload for request in requests) + b']'
+            async with get_scheduler(self.w3).request(max(request.priority for request in requests)):
+                responses = json.loads(await post(self.endpoint, body))
+            if not isinstance(responses, list):
+                raise ValueError(f'Expected a list of responses to a batch request, got {responses}')
+            for response in responses:
+                if isinstance(response, dict) and 'result' in response:
+                    results[response.get('id')] = HexBytes(response['result'])
+        except Exception as e:
+            logger.warning(f'json-rpc batch of {len(requests)} requests failed, sending them one by one: {e!r}')
+        for request in requests:
+            set_result(request.future, results.get(request.id, RETRY))
+
+
+# Batches are collected on a loop, so every loop has its own transports.
+transports: "WeakKeyDictionary[asyncio.AbstractEventLoop,Dict[str,BatchTransport]]" = WeakKeyDictionary()
+
+def get_transport(w3: Web3) -> Optional[BatchTransport]:
+    '''
+    Returns the `BatchTransport` for `w3`'s endpoint on the running loop, or None if requests to `w3` can't be batched.
+    '''
+    if not RPC_BATCH:
+        return None
+    try:
+        endpoint = get_endpoint(w3)
+    except AttributeError:
+        return None
+    if not isinstance(endpoint, str) or not endpoint.startswith('http'):
+        return None
+    loop_transports = transports.setdefault(asyncio.get_event_loop(), {})
+    if endpoint not in loop_transports:
+        loop_transports[endpoint] = BatchTransport(w3)
+    return loop_transports[endpoint]
+
+async def eth_call(w3: Web3, args: List[Any], priority: int = 0) -> bytes:
+    '''
+    Sends `eth_call` with `args` from `prep_calldata_args`, through a json-rpc batch if MULTICALL_RPC_BATCH is set.
+    '''
+    transport = get_transport(w3)
+    if transport is not None:
+        result = await transport.call(args, priority)
+        if result is not RETRY:
+            return result
+    async with get_scheduler(w3).request(priority):
+        return await get_async_w3(w3).eth.call(*args)
@@ -1,14 +1,22 @@
 
 import asyncio
+import atexit
+import os
+import threading
 from concurrent.futures import ProcessPoolExecutor
-from typing import Any, Awaitable, Callable, Coroutine, Dict, Iterable
+from typing import (Any, AsyncIterator, Awaitable, Callable, Coroutine, Dict,
+                    Iterable, Iterator, Optional)
 
 import eth_retry
-from web3 import AsyncHTTPProvider, Web3
+from web3 import IPCProvider, Web3, WebsocketProvider
 from web3.eth import AsyncEth
 from web3.providers.async_base import AsyncBaseProvider
 
-from multicall.constants import AIOHTTP_TIMEOUT, NUM_PROCESSES, Network
+from multicall.constants import (AIOHTTP_TIMEOUT, LOOP_THREAD, NUM_PROCESSES,
+                                 Network)
+from multicall.persistent import AsyncIPCProvider, AsyncWebsocketProvider
+from multicall.pool import AsyncHTTPProviderPool, HTTPProviderPool
+from multicall.session import SessionHTTPProvider, close_session
 
 chainids: Dict[Web3,int] = {}
 
@@ -32,6 +40,8 @@ def get_endpoint(w3: Web3) -> str:
         return provider
     if hasattr(provider, "_active_provider"):
         provider = provider._get_active_provider(False)
+    if isinstance(provider, IPCProvider):
+        return provider.ipc_path
     return provider.endpoint_uri
 
 def get_async_w3(w3: Web3) -> Web3:
@@ -43,8 +53,18 @@ def get_async_w3(w3: Web3) -> Web3:
         async_w3s[w3] = w3
         return w3
     request_kwargs = {'timeout': AIOHTTP_TIMEOUT}
+    # A pool of endpoints gets an async pool sharing its endpoint stats.
+    if isinstance(w3.provider, HTTPProviderPool):
+        provider = AsyncHTTPProviderPool(w3.provider)
+    # IPC and websockets get a connection that stays open.
+    elif isinstance(w3.provider, IPCProvider):
+        provider = AsyncIPCProvider(w3.provider.ipc_path)
+    elif isinstance(w3.provider, WebsocketProvider):
+        provider = AsyncWebsocketProvider(w3.provider.endpoint_uri)
+    else:
+        provider = SessionHTTPProvider(get_endpoint(w3), request_kwargs)
     async_w3 = Web3(
-        provider=AsyncHTTPProvider(get_endpoint(w3), request_kwargs),
+        provider=provider,
         # In older web3 versions, AsyncHTTPProvider objects come
         # with incompatible synchronous middlewares by default.
         middlewares=[],
@@ -59,10 +79,92 @@ def get_event_loop() -> asyncio.AbstractEventLoop:
     except RuntimeError as e: # Necessary for use with multi-threaded applications.
         if not str(e).startswith("There is no current event loop in thread"):
             raise e
-        return asyncio.new_event_loop()
+        # Keep using this loop in this thread, so its session and connections get reused.
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+
+class LoopThread:
+    """
+    An event loop running forever in a daemon thread. Sync calls from every thread run their coroutines on it,
+    so they share its sessions, connections and in-flight requests instead of each thread spinning up a loop of its own.
+    """
+    def __init__(self) -> None:
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, name='multicall-loop', daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def stop(self) -> None:
+        if self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(close_session(), self.loop).result(timeout=5)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+loop_thread: Optional[LoopThread] = None
+loop_thread_lock = threading.Lock()
+
+def get_loop_thread() -> LoopThread:
+    global loop_thread
+    with loop_thread_lock:
+        # A forked child doesn't inherit the parent's thread, it gets its own.
+        if loop_thread is None or loop_thread.pid != os.getpid():
+            loop_thread = LoopThread()
+        return loop_thread
+
+@atexit.register
+def stop_loop_thread() -> None:
+    if loop_thread is not None and loop_thread.pid == os.getpid():
+        loop_thread.stop()
+
+async def _await(awaitable: Awaitable) -> Any:
+    return await awaitable
 
 def await_awaitable(awaitable: Awaitable) -> Any:
-    return get_event_loop().run_until_complete(awaitable)
+    '''
+    Waits for `awaitable` from sync code. Unless MULTICALL_LOOP_THREAD is disabled, it runs on multicall's background loop,
+    which also works when the calling thread is already running a loop of its own.
+    '''
+    # Futures belong to the loop they were made on.
+    if not LOOP_THREAD or asyncio.isfuture(awaitable):
+        return get_event_loop().run_until_complete(awaitable)
+    thread = get_loop_thread()
+    if threading.current_thread() is thread.thread:
+        raise RuntimeError("Can't wait synchronously on multicall's own event loop, await instead.")
+    future = asyncio.run_coroutine_threadsafe(_await(awaitable), thread.loop)
+    try:
+        return future.result()
+    except BaseException:
+        # KeyboardInterrupt and the like shouldn't leave the coroutine running.
+        future.cancel()
+        raise
+
+def iterate_sync(iterator: AsyncIterator) -> Iterator:
+    '''
+    Iterates over `iterator` from sync code, waiting for each item with `await_awaitable`. It is closed when the caller stops iterating.
+    '''
+    try:
+        while True:
+            try:
+                yield await_awaitable(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        await_awaitable(iterator.aclose())
+
+def set_result(future: asyncio.Future, result: Any) -> None:
+    '''
+    Sets the result of `future` unless it is already done, e.g. cancelled by whoever was waiting for it.
+    '''
+    if not future.done():
+        future.set_result(result)
 
 async def run_in_subprocess(callable: Callable, *args: Any, **kwargs) -> Any:
     if NUM_PROCESSES == 1:
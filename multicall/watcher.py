@@ -0,0 +1,153 @@
+"""
+Runs a multicall again on every new block and reports what changed.
+
+New blocks come from an `eth_subscribe` to `newHeads` when the node is reached over IPC or a websocket, otherwise `eth_blockNumber`
+is polled. The calls are batched and encoded once. Each run compares the raw output of every call with the one before it, only the
+outputs that changed are decoded and handed on. A block that arrives while a run is still in flight isn't run, once the run is done
+the newest block is run instead.
+"""
+
+import asyncio
+from typing import (Any, AsyncIterator, Callable, Dict, Iterator, List,
+                    NamedTuple, Optional, Sequence, Tuple, Union)
+
+from web3 import Web3
+
+from multicall.call import Call, apply_returns
+from multicall.constants import w3
+from multicall.envelope import Target
+from multicall.loggers import setup_logger
+from multicall.multicall import CallResponse, Multicall, merge_outputs
+from multicall.persistent import PersistentProvider
+from multicall.utils import gather, get_async_w3, iterate_sync
+
+logger = setup_logger(__name__)
+
+
+class BlockChanges(NamedTuple):
+    block: int
+    # The values that changed since the previous run, by `returns` name. The first run has every value.
+    changes: Dict[str,Any]
+
+
+class Watcher:
+    """
+    Runs `multicall` at every new block and yields a `BlockChanges` for each run where something changed.
+    Pass a list of calls instead of a `Multicall` to watch them with the default settings.
+    """
+    def __init__(self, multicall: Union[Multicall,List[Call]], poll_interval: float = 1.0, _w3: Web3 = w3) -> None:
+        self.multicall = multicall if isinstance(multicall, Multicall) else Multicall(multicall, _w3=_w3)
+        self.w3 = self.multicall.w3
+        self.poll_interval = poll_interval
+        # The raw output of each call in each batch at the last run.
+        self.outputs: List[Optional[List[Tuple[Optional[bool],bytes]]]] = []
+        self.block: Optional[int] = None
+        self.skipped = 0
+
+    async def watch(self) -> AsyncIterator[BlockChanges]:
+        multicall = self.multicall
+        await multicall.measure_gas([(call.target_bytes, call.data) for call in multicall.calls])
+        batches = []
+        for batch in multicall.batcher.batch_calls(multicall.calls, multicall.batcher.step):
+            targets = [(call.target_bytes, call.data) for call in batch]
+            batches.append((batch, targets, multicall.encode_aggregate(targets)))
+        self.outputs = [None] * len(batches)
+
+        heads = self.heads().__aiter__()
+        next_head = asyncio.ensure_future(heads.__anext__())
+        run: Optional[asyncio.Future] = None
+        latest: Optional[int] = None
+        try:
+            while True:
+                await asyncio.wait([task for task in (next_head, run) if task is not None], return_when=asyncio.FIRST_COMPLETED)
+                if run is not None and run.done():
+                    error = run.exception()
+                    changes = None if error else run.result()
+                    run = None
+                    if error:
+                        # Keep watching, the next block is run as usual.
+                        logger.warning(f'watching block {self.block} failed: {error!r}')
+                    elif changes.changes:
+                        yield changes
+                if next_head.done():
+                    latest = next_head.result()
+                    next_head = asyncio.ensure_future(heads.__anext__())
+                    if run is not None:
+                        self.skipped += 1
+                        logger.debug(f'block {latest} arrived while block {self.block} was still running, skipping it')
+                if run is None and latest is not None and (self.block is None or latest > self.block):
+                    self.block = latest
+                    run = asyncio.ensure_future(self.run_block(latest, batches))
+        finally:
+            pending = [task for task in (next_head, run) if task is not None and not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await heads.aclose()
+
+    def watch_sync(self) -> Iterator[BlockChanges]:
+        """ Sync counterpart of `watch`. """
+        return iterate_sync(self.watch())
+
+    async def run(self, callback: Callable[[BlockChanges],Any]) -> None:
+        """ Calls `callback` with the changes of each block, forever. """
+        async for changes in self.watch():
+            callback(changes)
+
+    async def run_block(self, block: int, batches: List[Tuple[List[Call],List[Target],bytes]]) -> BlockChanges:
+        multicall = self.multicall.at_block(block)
+        results = await gather([
+            self.fetch_changes(multicall, i, calls, targets, calldata)
+            for i, (calls, targets, calldata) in enumerate(batches)
+        ])
+        # Only once every batch made it, a failed run leaves the outputs as they were so the next run reports its changes.
+        for i, raw, _ in results:
+            self.outputs[i] = raw
+        return BlockChanges(block, merge_outputs([result for _, _, values in results for result in values]))
+
+    async def fetch_changes(
+        self, multicall: Multicall, i: int, calls: List[Call], targets: List[Target], calldata: bytes
+    ) -> Tuple[int,List[Tuple[Optional[bool],bytes]],List[Any]]:
+        """
+        Fetches one batch with its pre-encoded calldata, and decodes and applies `returns` only for the calls whose output changed.
+        Returns `i`, the raw outputs to compare the next run with and the changed values.
+        """
+        try:
+            outputs: Sequence[CallResponse] = multicall.mark_outputs(targets, await multicall.send_aggregate(calldata))
+        except Exception as e:
+            # Let `fetch_raw_outputs` split up, retry or isolate failures.
+            logger.debug(f'watching block {multicall.block_id}: batch {i} failed, fetching it again: {e!r}')
+            outputs = await multicall.fetch_raw_outputs(targets, 0, f'{multicall.block_id}_{i}')
+        raw = [(success, bytes(output)) for success, output in outputs]
+        previous = self.outputs[i]
+        changed = [j for j, output in enumerate(raw) if previous is None or output != previous[j]]
+        changed = [j for j in changed if not multicall.isolated(calls[j], raw[j][0])]
+        if not changed:
+            return i, raw, []
+        changed_calls = [calls[j] for j in changed]
+        values = await multicall.decode_values(changed_calls, [raw[j] for j in changed])
+        return i, raw, [
+            apply_returns(value, call.returns, value is not None if multicall.call_allows_failure(call) else None)
+            for call, value in zip(changed_calls, values)
+        ]
+
+    async def heads(self) -> AsyncIterator[int]:
+        """ Yields the number of each new block, from a `newHeads` subscription if the provider supports one, by polling otherwise. """
+        provider = get_async_w3(self.w3).provider
+        while isinstance(provider, PersistentProvider):
+            try:
+                async for head in provider.subscribe(['newHeads']):
+                    yield int(head['number'], 16)
+            except ConnectionError as e:
+                logger.warning(f'newHeads subscription lost, subscribing again: {e!r}')
+                await asyncio.sleep(self.poll_interval)
+            except ValueError as e:
+                logger.warning(f'unable to subscribe to newHeads, polling instead: {e!r}')
+                break
+        last = None
+        while True:
+            block = await get_async_w3(self.w3).eth.block_number
+            if last is None or block > last:
+                last = block
+                yield block
+            await asyncio.sleep(self.poll_interval)
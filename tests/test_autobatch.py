@@ -0,0 +1,77 @@
+import asyncio
+
+from brownie import chain, web3
+from multicall import Call
+from multicall.autobatch import get_dispatcher, set_autobatch
+from multicall.constants import MULTICALL3_ADDRESS
+from multicall.snapshot import Snapshot
+from multicall.utils import await_awaitable
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+DAI = '0x6B175474E89094C44Da98b954EedeAC495271d0F'
+
+
+def run_with_autobatch(coroutines):
+    set_autobatch(True)
+    try:
+        async def run():
+            return await asyncio.gather(*coroutines, return_exceptions=True)
+        return await_awaitable(run())
+    finally:
+        set_autobatch(False)
+
+def test_autobatch():
+    calls = [
+        Call(CHAI, 'totalSupply()(uint256)', [['supply', None]]),
+        Call(DAI, 'decimals()(uint8)', [['decimals', None]]),
+        Call(DAI, ['balanceOf(address)(uint256)', CHAI], [['balance', None]]),
+    ]
+    expected = [call.coroutine() for call in calls]
+    expected = await_awaitable(asyncio.gather(*expected))
+    assert run_with_autobatch([call.coroutine() for call in calls]) == expected
+
+def test_autobatch_failed_call():
+    # Nobody holds this much CHAI, so the transfer reverts. The failed call is sent again on its own to get the node's error
+    results = run_with_autobatch([
+        Call(CHAI, ['transfer(address,uint256)(bool)', CHAI, 2**256 - 1], [['success', None]]).coroutine(),
+        Call(DAI, 'decimals()(uint8)', [['decimals', None]]).coroutine(),
+    ])
+    assert isinstance(results[0], Exception)
+    assert results[1] == {'decimals': 18}
+
+def test_autobatch_groups_by_block():
+    block = web3.eth.block_number
+    async def queue():
+        dispatcher = get_dispatcher()
+        dispatcher.window = 10
+        calls = [Call(DAI, 'decimals()(uint8)', block_id=block - i % 2) for i in range(4)]
+        tasks = [asyncio.ensure_future(call.coroutine()) for call in calls]
+        await asyncio.sleep(0)
+        groups = len(dispatcher.groups)
+        for key in list(dispatcher.groups):
+            dispatcher.flush(key)
+        dispatcher.window = 0
+        await asyncio.gather(*tasks)
+        return groups
+    set_autobatch(True)
+    try:
+        assert await_awaitable(queue()) == 2
+    finally:
+        set_autobatch(False)
+
+def test_autobatch_ignores_snapshot():
+    # The group is opened inside a snapshot, but calls without a block read latest whether they are batched or not
+    async def run():
+        with Snapshot():
+            chain.mine()
+            inside = asyncio.ensure_future(Call(MULTICALL3_ADDRESS, 'getBlockNumber()(uint256)', [['block', None]]).coroutine())
+        outside = asyncio.ensure_future(Call(MULTICALL3_ADDRESS, 'getCurrentBlockTimestamp()(uint256)', [['timestamp', None]]).coroutine())
+        return await asyncio.gather(inside, outside)
+    set_autobatch(True)
+    try:
+        inside, outside = await_awaitable(run())
+    finally:
+        set_autobatch(False)
+    latest = web3.eth.get_block('latest')
+    assert inside == {'block': latest['number']}
+    assert outside == {'timestamp': latest['timestamp']}
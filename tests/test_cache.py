@@ -0,0 +1,64 @@
+import pytest
+from brownie import web3
+from multicall import Call, Multicall
+from multicall.cache import (MemoryCache, ResultCache, SQLiteCache, get_cache,
+                             set_cache)
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+KEY = (1, bytes.fromhex(CHAI[2:]), bytes.fromhex('18160ddd'), 15_000_000)
+
+
+def test_memory_cache_eviction():
+    cache = MemoryCache(max_bytes=10_000)
+    cache.set_many([(KEY[:3] + (block,), bytes(32)) for block in range(100)])
+    assert cache.size <= 10_000
+    assert cache.get(KEY[:3] + (99,)) == bytes(32)
+    assert cache.get(KEY[:3] + (0,)) is None
+
+def test_incomplete_cache():
+    class GetOnlyCache(ResultCache):
+        def get_many(self, keys):
+            return [None] * len(keys)
+    with pytest.raises(TypeError):
+        GetOnlyCache()
+
+def test_sqlite_cache(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SQLiteCache(path).set(KEY, b'\x01' * 32)
+    assert SQLiteCache(path).get_many([KEY, KEY[:3] + (1,)]) == [b'\x01' * 32, None]
+
+def test_multicall_partial_hit():
+    previous = get_cache()
+    cache = MemoryCache()
+    set_cache(cache)
+    try:
+        block = web3.eth.block_number - 10
+        supply = Call(CHAI, 'totalSupply()(uint256)', [['supply', None]])
+        balance = Call(CHAI, ['balanceOf(address)(uint256)', CHAI], [['balance', None]])
+        first = Multicall([supply], block_id=block)()
+        assert len(cache) == 1
+        second = Multicall([supply, balance], block_id=block)()
+        assert second['supply'] == first['supply']
+        assert len(cache) == 2
+        # calls at 'latest' are never cached
+        Multicall([supply, balance])()
+        assert len(cache) == 2
+    finally:
+        set_cache(previous)
+
+def test_state_override_not_cached():
+    previous = get_cache()
+    cache = MemoryCache()
+    set_cache(cache)
+    try:
+        block = web3.eth.block_number - 10
+        # Returns 42 whatever it is called with
+        overridden = Call(CHAI, 'totalSupply()(uint256)', [['supply', None]], block_id=block, state_override_code='0x602a60005260206000f3')
+        plain = Call(CHAI, 'totalSupply()(uint256)', [['supply', None]], block_id=block)
+        assert overridden()['supply'] == 42
+        supply = plain()['supply']
+        assert supply != 42
+        assert Multicall([plain], block_id=block)()['supply'] == supply
+        assert overridden()['supply'] == 42
+    finally:
+        set_cache(previous)
@@ -1,6 +1,8 @@
 from brownie import web3
 from joblib import Parallel, delayed
-from multicall import Call
+from eth_abi import encode_abi
+from multicall import Call, Signature
+from multicall.call import apply_returns, decode_batch
 from multicall.utils import await_awaitable
 
 CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
@@ -51,3 +53,25 @@ def test_call_multiprocessing():
     # TODO figure out why multiprocessing fails if you don't call request_func here
     web3.provider.request_func(web3, web3.middleware_onion)
     Parallel(4,'multiprocessing')(delayed(Call(CHAI, 'name()(string)', [['name', None]], _w3=web3))() for i in range(10))
+
+
+def test_decode_batch():
+    signatures = [Signature('totalSupply()(uint256)'), Signature('name()(string)')]
+    outputs = [(None, encode_abi(['uint256'], [1])), (True, encode_abi(['string'], ['Chai'])), (False, b''), (True, b'')]
+    assert decode_batch(signatures, [0, 1, 0, 0], outputs) == [(1,), ('Chai',), None, None]
+
+
+def test_apply_returns():
+    assert apply_returns((10**18,), [['supply', from_wei]]) == {'supply': 1.0}
+    assert apply_returns(None, [['supply', lambda success, value: (success, value)]], False) == {'supply': (False, None)}
+    assert apply_returns((1, 2)) == (1, 2)
+
+
+def test_call_compact():
+    call = Call(CHAI.lower(), ['balanceOf(address)(uint256)', CHAI], [['balance', from_wei]])
+    assert not hasattr(call, '__dict__')
+    assert call.target_bytes == bytes.fromhex(CHAI[2:])
+    assert call.target == CHAI
+    assert call.data is call.data
+    call.args = [call.target]
+    assert call.data == call.signature.encode_data([CHAI])
@@ -0,0 +1,60 @@
+import pytest
+from brownie import web3
+from eth_abi.exceptions import InsufficientDataBytes
+from multicall import Call, Multicall
+from multicall.deployless import (DEPLOYLESS_INITCODE, MAX_INITCODE_BYTES,
+                                  decode_deployless, encode_deployless)
+from multicall.multicall import get_batcher
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+# Nobody holds this much CHAI, so the transfer reverts
+TRANSFER = ['transfer(address,uint256)(bool)', CHAI, 2**256 - 1]
+
+
+def test_encode_deployless():
+    calls = [(CHAI, b'\x18\x16\x0d\xdd'), (CHAI, b'\x70\xa0\x82\x31' + bytes(32))]
+    data = encode_deployless(calls, [True, False])
+    assert data.endswith(
+        (1 << 255 | int(CHAI, 16)).to_bytes(32, 'big') + (4).to_bytes(32, 'big') + b'\x18\x16\x0d\xdd' + bytes(28)
+        + int(CHAI, 16).to_bytes(32, 'big') + (36).to_bytes(32, 'big') + b'\x70\xa0\x82\x31' + bytes(60)
+    )
+
+def test_decode_deployless():
+    output = (1 << 255 | 33).to_bytes(32, 'big') + b'\x01' * 33 + bytes(31) + (0).to_bytes(32, 'big')
+    assert [(success, bytes(result)) for success, result in decode_deployless(output)] == [(True, b'\x01' * 33), (False, b'')]
+
+def test_decode_deployless_truncated():
+    output = (1 << 255 | 33).to_bytes(32, 'big') + b'\x01' * 33 + bytes(31)
+    with pytest.raises(InsufficientDataBytes):
+        decode_deployless(output[:-32])
+    with pytest.raises(InsufficientDataBytes):
+        decode_deployless(output + bytes(16))
+
+def test_deployless_batcher():
+    multi = Multicall([Call(CHAI, 'totalSupply()(uint256)', [['supply', None]])], deployless=True)
+    assert multi.batcher is get_batcher(web3, deployless=True)
+    assert multi.batcher is not get_batcher(web3)
+    assert len(DEPLOYLESS_INITCODE) + multi.batcher.max_bytes <= MAX_INITCODE_BYTES
+
+def test_deployless_multicall():
+    calls = [
+        Call(CHAI, 'totalSupply()(uint256)', [['supply', None]]),
+        Call(CHAI, ['balanceOf(address)(uint256)', CHAI], [['balance', None]]),
+        Call(CHAI, TRANSFER, [['transfer', lambda success, value: success]], allow_failure=True),
+    ]
+    block = web3.eth.block_number
+    multi = Multicall(calls, block_id=block, deployless=True)
+    assert multi.deployless
+    assert multi() == Multicall(calls, block_id=block)()
+    assert multi()['transfer'] is False
+
+def test_deployless_multicall_strict_failure():
+    # A strict call that reverts makes the initcode revert
+    calls = [
+        Call(CHAI, 'totalSupply()(uint256)', [['supply', None]]),
+        Call(CHAI, TRANSFER, [['transfer', None]], allow_failure=False),
+    ]
+    multi = Multicall(calls, require_success=False, deployless=True)
+    assert multi.deployless
+    with pytest.raises(Exception):
+        multi()
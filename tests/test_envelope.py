@@ -0,0 +1,48 @@
+from eth_abi import encode_abi
+from multicall import Signature
+from multicall.envelope import (decode_aggregate, decode_try_aggregate,
+                                decode_try_block_and_aggregate,
+                                encode_aggregate, encode_aggregate3)
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+calls = [(CHAI, b'\x06\xfd\xde\x03'), (CHAI, b'\x18\x16\x0d\xdd'), (CHAI, b'\x70\xa0\x82\x31' + b'\x00' * 12 + bytes.fromhex(CHAI[2:]))]
+outputs = [b'', b'\x01' * 32, b'\x02' * 33]
+
+
+def test_encode_aggregate():
+    sig = Signature('aggregate((address,bytes)[])(uint256,bytes[])')
+    assert encode_aggregate(sig.fourbyte, calls) == sig.encode_data([calls])
+
+
+def test_encode_try_aggregate():
+    for signature in ['tryAggregate(bool,(address,bytes)[])((bool,bytes)[])', 'tryBlockAndAggregate(bool,(address,bytes)[])(uint256,uint256,(bool,bytes)[])']:
+        sig = Signature(signature)
+        for require_success in [True, False]:
+            assert encode_aggregate(sig.fourbyte, calls, require_success) == sig.encode_data([require_success, calls])
+
+
+def test_encode_aggregate3():
+    sig = Signature('aggregate3((address,bool,bytes)[])((bool,bytes)[])')
+    allow_failures = [True, False, True]
+    expected = sig.encode_data([[(target, allow_failure, data) for (target, data), allow_failure in zip(calls, allow_failures)]])
+    assert encode_aggregate3(sig.fourbyte, calls, allow_failures) == expected
+
+
+def test_decode_aggregate():
+    block, results = decode_aggregate(encode_abi(['uint256', 'bytes[]'], [1, outputs]))
+    assert block == 1
+    assert [bytes(result) for result in results] == outputs
+
+
+def test_decode_try_aggregate():
+    expected = [(i % 2 == 0, output) for i, output in enumerate(outputs)]
+    results = decode_try_aggregate(encode_abi(['(bool,bytes)[]'], [expected]))
+    assert [(success, bytes(result)) for success, result in results] == expected
+
+
+def test_decode_try_block_and_aggregate():
+    expected = [(i % 2 == 0, output) for i, output in enumerate(outputs)]
+    block, block_hash, results = decode_try_block_and_aggregate(encode_abi(['uint256', 'bytes32', '(bool,bytes)[]'], [1, b'\xff' * 32, expected]))
+    assert block == 1
+    assert block_hash == 2 ** 256 - 1
+    assert [(success, bytes(result)) for success, result in results] == expected
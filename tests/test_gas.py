@@ -0,0 +1,49 @@
+from brownie import web3
+from multicall import Call
+from multicall.gas import (GasProfile, chunk_samples, decode_gas, gas_key,
+                          set_gas_profile, usable_gas)
+from multicall.multicall import AdaptiveBatcher
+from multicall.utils import await_awaitable
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+DAI = '0x6B175474E89094C44Da98b954EedeAC495271d0F'
+
+
+def test_decode_gas():
+    output = (1 << 255 | 50_000 << 128 | 2_600).to_bytes(32, 'big') + (40_000 << 128 | 300).to_bytes(32, 'big')
+    assert decode_gas(output) == [(True, 2_600, 50_000), (False, 300, 40_000)]
+
+def test_usable_gas():
+    samples = [(DAI, b'\x01' * 4), (DAI, b'\x02' * 4), (DAI, b'\x03' * 4), (CHAI, b'\x04' * 4)]
+    # A success, a cheap revert, a failure that burned what it was forwarded and one starved by it
+    measured = [(True, 30_000, 50_000_000), (False, 3_000, 49_960_000), (False, 49_000_000, 49_950_000), (False, 935_000, 950_000)]
+    assert usable_gas(samples, measured) == [(gas_key(samples[0]), 30_000), (gas_key(samples[1]), 3_000)]
+
+def test_chunk_samples():
+    targets = [(DAI, bytes(36))] * 1_000
+    chunks = chunk_samples(targets)
+    assert sum(len(chunk) for chunk in chunks) == 1_000
+    assert all(len(chunk) <= 512 for chunk in chunks)
+
+def test_gas_profile_measure(tmp_path):
+    path = str(tmp_path / 'gas.json')
+    profile = GasProfile(path)
+    calls = [Call(DAI, ['balanceOf(address)(uint256)', CHAI]), Call(DAI, 'totalSupply()(uint256)')]
+    targets = [(call.target_bytes, call.data) for call in calls]
+    await_awaitable(profile.measure(web3, targets))
+    assert len(profile) == 2
+    assert all(profile.gas[gas_key(target)] > 0 for target in targets)
+    assert len(GasProfile(path)) == 2
+    assert profile.unknown(targets) == []
+
+def test_batcher_uses_gas_profile():
+    profile = GasProfile()
+    target = (DAI, Call(DAI, 'totalSupply()(uint256)').data)
+    profile.record([(gas_key(target), 100_000)])
+    batcher = AdaptiveBatcher(max_gas=1_000_000)
+    set_gas_profile(profile)
+    try:
+        assert batcher.estimate_gas(*target) == profile.estimate(*target) > 100_000
+        assert len(batcher.batch_calls([Call(DAI, 'totalSupply()(uint256)')] * 20)) == 3
+    finally:
+        set_gas_profile(None)
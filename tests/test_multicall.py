@@ -1,13 +1,20 @@
+import asyncio
 from typing import Any, Tuple
 
+import pytest
 from brownie import web3
 from joblib import Parallel, delayed
 from multicall import Call, Multicall
-from multicall.multicall import batcher
+from multicall.call import eth_balance
+from multicall.multicall import (AdaptiveBatcher, SweepChunk, add_to_chunk,
+                                 batcher, failure_key, get_batcher,
+                                 known_failures)
 from multicall.utils import await_awaitable
 
 CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
 DUMMY_CALL = Call(CHAI, 'totalSupply()(uint)', [['totalSupply',None]])
+# Nobody holds this much CHAI, so the transfer reverts with chai/insufficient-balance
+REVERTING_TRANSFER = [CHAI, ['transfer(address,uint256)(bool)', CHAI, 2**256 - 1]]
 batcher.step = 10_000
 
 def from_wei(val):
@@ -111,12 +118,39 @@ def test_batcher_split_calls_odd():
     assert len(split[1]) == 15_000
 
 def test_batcher_step_down_and_retry():
-    batcher.step = 100_000
+    adaptive = AdaptiveBatcher(step=100_000, max_gas=10**12)
     calls = [Call(CHAI, 'totalSupply()(uint)', [[f'totalSupply{i}',None]]) for i in range(100_000)]
-    results = Multicall(calls)()
-    assert batcher.step < 100_000
+    results = Multicall(calls, batcher=adaptive)()
+    assert adaptive.step < 100_000
     assert len(results) == len(calls)
 
+def test_get_batcher_per_endpoint():
+    assert get_batcher(web3) is get_batcher(web3)
+    assert Multicall([DUMMY_CALL]).batcher is get_batcher(web3)
+    adaptive = AdaptiveBatcher()
+    assert Multicall([DUMMY_CALL], batcher=adaptive).batcher is adaptive
+
+def test_adaptive_batcher_limits():
+    calls = [DUMMY_CALL for i in range(1_000)]
+    assert [len(batch) for batch in AdaptiveBatcher(step=300).batch_calls(calls)] == [300, 300, 300, 100]
+    assert [len(batch) for batch in AdaptiveBatcher(gas_per_call=10, max_gas=2_500).batch_calls(calls)] == [250] * 4
+    # DUMMY_CALL takes 192 bytes in the aggregate3 envelope
+    assert [len(batch) for batch in AdaptiveBatcher(max_bytes=192 * 500).batch_calls(calls)] == [500, 500]
+
+def test_adaptive_batcher_aimd():
+    adaptive = AdaptiveBatcher(step=1_000, increase=10, decrease=0.5)
+    calls = [DUMMY_CALL for i in range(1_000)]
+    assert len(await_awaitable(adaptive.rebatch(calls))) == 2
+    assert adaptive.step == 500
+    # a batch that was cut before the decrease doesn't shrink step again
+    adaptive.record_failure(calls)
+    assert adaptive.step == 500
+    adaptive.record_success(calls[:500])
+    assert adaptive.step == 510
+    # batches smaller than step don't grow it
+    adaptive.record_success(calls[:100])
+    assert adaptive.step == 510
+
 def test_multicall_threading():
     calls = [Call(CHAI, 'totalSupply()(uint)', [[f'totalSupply{i}',None]]) for i in range(50_000)]
     Parallel(4,'threading')(delayed(Multicall(batch))() for batch in batcher.batch_calls(calls, batcher.step))
@@ -129,3 +163,121 @@ def test_multicall_multiprocessing():
     web3.provider.request_func(web3, web3.middleware_onion)
     calls = [Call(CHAI, 'totalSupply()(uint)', [[f'totalSupply{i}',None]]) for i in range(50_000)]
     Parallel(4,'multiprocessing')(delayed(Multicall(batch, _w3=web3))() for batch in batcher.batch_calls(calls, batcher.step))
+
+def test_multicall_stream():
+    calls = [Call(CHAI, 'totalSupply()(uint)', [[f'totalSupply{i}',None]]) for i in range(1_000)]
+    multi = Multicall(calls, batcher=AdaptiveBatcher(step=100, increase=0))
+    parts = list(multi.stream_sync(ordered=True))
+    assert len(parts) == 10
+    assert list(parts[0]) == [f'totalSupply{i}' for i in range(100)]
+    assert {name: value for part in parts for name, value in part.items()} == multi()
+
+def test_multicall_stream_async():
+    calls = [Call(CHAI, 'totalSupply()(uint)', [[f'totalSupply{i}',None]]) for i in range(1_000)]
+    multi = Multicall(calls, batcher=AdaptiveBatcher(step=100, increase=0))
+    async def first_two():
+        parts = []
+        async for part in multi.stream():
+            parts.append(part)
+            if len(parts) == 2:
+                break
+        return parts
+    parts = await_awaitable(first_two())
+    assert len(parts) == 2 and all(len(part) == 100 for part in parts)
+
+def test_multicall_duplicate_calls():
+    calls = [Call(CHAI, 'totalSupply()(uint)', [[f'totalSupply{i}',from_wei]]) for i in range(3)]
+    calls.append(Call(CHAI, 'totalSupply()(uint)', [['raw',None]]))
+    result = Multicall(calls)()
+    assert result['totalSupply0'] == result['totalSupply1'] == result['totalSupply2'] == from_wei(result['raw'])
+
+def test_concurrent_multicalls_coalesce():
+    async def run():
+        return await asyncio.gather(*[Multicall([DUMMY_CALL]).coroutine() for _ in range(5)])
+    results = await_awaitable(run())
+    assert all(result == results[0] for result in results)
+
+def test_concurrent_multicalls_owner_fails():
+    # The multicall that fetches DUMMY_CALL fails because of the transfer, the other one fetches it again on its own
+    async def run():
+        failing = Multicall([DUMMY_CALL, Call(*REVERTING_TRANSFER, [['success', None]])])
+        return await asyncio.gather(failing.coroutine(), Multicall([DUMMY_CALL]).coroutine(), return_exceptions=True)
+    failed, result = await_awaitable(run())
+    assert isinstance(failed, Exception)
+    assert isinstance(result['totalSupply'], int)
+
+def test_multicall_sweep(tmp_path):
+    head = web3.eth.block_number
+    blocks = range(head - 20, head)
+    multi = Multicall([
+        Call(CHAI, 'totalSupply()(uint256)', [['supply', None]]),
+        Call(CHAI, ['balanceOf(address)(uint256)', CHAI], [['balance', None]]),
+    ])
+    chunks = list(multi.sweep_sync(blocks, step=2, chunk_size=4))
+    assert [len(chunk.blocks) for chunk in chunks] == [4, 4, 2]
+    assert [block for chunk in chunks for block in chunk.blocks] == list(blocks[::2])
+    assert chunks[0].columns['supply'][0] == Multicall(multi.calls, block_id=blocks[0])()['supply']
+
+    checkpoint = str(tmp_path / 'checkpoint')
+    sweep = multi.sweep_sync(blocks, chunk_size=5, checkpoint=checkpoint)
+    next(sweep)
+    next(sweep)
+    sweep.close()
+    assert open(checkpoint).read() == str(blocks[4])
+    resumed = list(multi.sweep_sync(blocks, chunk_size=5, checkpoint=checkpoint))
+    assert resumed[0].blocks[0] == blocks[5]
+
+def test_multicall_sweep_isolated_failure():
+    # A call isolated at one block leaves None in its column there, so later values stay in line with their blocks
+    chunk = SweepChunk([], {})
+    add_to_chunk(chunk, 1, {'supply': 1, 'success': True})
+    add_to_chunk(chunk, 2, {'supply': 2})
+    add_to_chunk(chunk, 3, {'supply': 3, 'success': True})
+    assert chunk.columns == {'supply': [1, 2, 3], 'success': [True, None, True]}
+
+    # The transfer reverts at every block, it's isolated and left out of the columns
+    head = web3.eth.block_number
+    transfer = Call(*REVERTING_TRANSFER, [['success', None]])
+    multi = Multicall([DUMMY_CALL, transfer], isolate_failures=True)
+    chunks = list(multi.sweep_sync(range(head - 3, head), chunk_size=3))
+    assert chunks[0].blocks == list(range(head - 3, head))
+    assert chunks[0].columns == {'totalSupply': [Multicall([DUMMY_CALL], block_id=block)()['totalSupply'] for block in chunks[0].blocks]}
+
+def test_multicall_isolate_failures():
+    # The transfer reverts, so the aggregate reverts
+    transfer = Call(*REVERTING_TRANSFER, [['success', None]])
+    balance = Call(CHAI, ['balanceOf(address)(uint256)', CHAI], [['balance', None]])
+    with pytest.raises(Exception):
+        Multicall([DUMMY_CALL, transfer, balance])()
+    multi = Multicall([DUMMY_CALL, transfer, balance], isolate_failures=True)
+    result = multi()
+    assert list(result) == ['totalSupply', 'balance']
+    assert multi.failures == [transfer]
+    assert failure_key(multi.chainid, (transfer.target_bytes, transfer.data)) in known_failures
+    # The known failure is sent separately next time
+    multi = Multicall([DUMMY_CALL, transfer, balance], isolate_failures=True)
+    assert multi() == result
+    assert multi.failures == [transfer]
+
+def test_multicall_allow_failure():
+    # The lenient transfer can revert while the strict calls share its batch
+    lenient = Call(*REVERTING_TRANSFER, [['success', unpack_no_success]], allow_failure=True)
+    multi = Multicall([DUMMY_CALL, lenient, eth_balance(CHAI, [['eth', None]])])
+    assert multi.multicall_sig == 'aggregate3((address,bool,bytes)[])((bool,bytes)[])'
+    assert multi.allows_failure((lenient.target_bytes, lenient.data))
+    assert not multi.allows_failure((DUMMY_CALL.target_bytes, DUMMY_CALL.data))
+    result = multi()
+    assert isinstance(result['totalSupply'], int)
+    assert result['success'] == (False, None)
+    assert result['eth'] == web3.eth.get_balance(CHAI)
+
+def test_multicall_allow_failure_strict():
+    # In a lenient multicall, a strict call that reverts still reverts the batch
+    lenient = Call(*REVERTING_TRANSFER, [['success', unpack_no_success]])
+    strict = Call(*REVERTING_TRANSFER, [['success', None]], allow_failure=False)
+    multi = Multicall([DUMMY_CALL, lenient], require_success=False)
+    assert multi()['success'] == (False, None)
+    multi = Multicall([DUMMY_CALL, strict], require_success=False)
+    assert not multi.allows_failure((strict.target_bytes, strict.data))
+    with pytest.raises(Exception):
+        multi()
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+from aiohttp import WSMsgType, web
+from web3 import IPCProvider, Web3, WebsocketProvider
+from web3.eth import AsyncEth
+
+from multicall.persistent import (AsyncIPCProvider, AsyncWebsocketProvider,
+                                  Connection, JSONStream)
+from multicall.utils import await_awaitable, get_async_w3
+
+
+class FakeNode:
+    """
+    Answers each eth_call with its calldata. The first request waits `delay` seconds, so later ones are answered first.
+    After `drop_after` requests, the connection is closed once without answering them.
+    """
+    def __init__(self, delay: float = 0.2, drop_after: int = 0) -> None:
+        self.delay = delay
+        self.drop_after = drop_after
+        self.requests = 0
+        self.received = 0
+        self.connections = 0
+        started = threading.Event()
+        threading.Thread(target=self.serve, args=(started,), daemon=True).start()
+        started.wait()
+
+    async def respond(self, request: dict) -> str:
+        self.requests += 1
+        if self.requests == 1:
+            await asyncio.sleep(self.delay)
+        return json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': request['params'][0]['data']})
+
+    def dropping(self) -> bool:
+        self.received += 1
+        return self.received == self.drop_after
+
+    def serve(self, started: threading.Event) -> None:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self.start())
+        started.set()
+        loop.run_forever()
+
+
+class FakeIPCNode(FakeNode):
+    async def start(self) -> None:
+        self.path = os.path.join(tempfile.mkdtemp(), 'node.ipc')
+        await asyncio.start_unix_server(self.handle, self.path)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        decoder = json.JSONDecoder()
+        buffer = ''
+        async def respond(request):
+            response = await self.respond(request)
+            if not writer.is_closing():
+                writer.write(response.encode())
+        while True:
+            chunk = await reader.read(2 ** 16)
+            if not chunk:
+                return
+            buffer += chunk.decode()
+            while buffer:
+                try:
+                    request, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break
+                buffer = buffer[end:]
+                if self.dropping():
+                    writer.close()
+                    return
+                asyncio.ensure_future(respond(request))
+
+
+class FakeWebsocketNode(FakeNode):
+    async def start(self) -> None:
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.url = f'ws://127.0.0.1:{port}'
+        app = web.Application()
+        app.router.add_get('/', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        self.connections += 1
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        async def respond(request):
+            response = await self.respond(request)
+            if not websocket.closed:
+                await websocket.send_str(response)
+        async for message in websocket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            if self.dropping():
+                await websocket.close()
+                break
+            asyncio.ensure_future(respond(json.loads(message.data)))
+        return websocket
+
+
+class FakeHeadsNode(FakeWebsocketNode):
+    """ Answers `eth_subscribe` and sends `heads` newHeads notifications right after. """
+    heads = 3
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        self.connections += 1
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        async for message in websocket:
+            request = json.loads(message.data)
+            if request['method'] == 'eth_subscribe':
+                await websocket.send_str(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0xab'}))
+                for i in range(self.heads):
+                    notification = {'subscription': '0xab', 'result': {'number': hex(i + 1)}}
+                    await websocket.send_str(json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription', 'params': notification}))
+            else:
+                await websocket.send_str(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': True}))
+        return websocket
+
+
+def async_w3(provider) -> Web3:
+    w3 = Web3(provider, middlewares=[])
+    w3.eth = AsyncEth(w3)
+    return w3
+
+async def calls(w3: Web3, n: int):
+    try:
+        return await asyncio.gather(*[w3.eth.call({'to': '0x' + '11' * 20, 'data': hex(i + 1)}) for i in range(n)])
+    finally:
+        await w3.provider.disconnect()
+
+
+def test_incomplete_connection():
+    class WriteOnlyConnection(Connection):
+        async def write(self, payload):
+            pass
+    with pytest.raises(TypeError):
+        WriteOnlyConnection('ws://localhost')
+
+def test_json_stream():
+    messages = [{'id': 1, 'result': 'é€ "}] \\'}, [{'id': 2}, {'id': 3, 'result': '😀'}]]
+    data = b''.join(json.dumps(message, ensure_ascii=False).encode() + b'\n' for message in messages)
+    # Split everywhere, including inside multibyte characters and escapes
+    stream = JSONStream()
+    assert [message for i in range(len(data)) for message in stream.feed(data[i:i + 1])] == messages
+    stream = JSONStream()
+    assert stream.feed(data[:7]) == []
+    assert stream.feed(data[7:]) == messages
+
+def test_ipc_pipelining():
+    node = FakeIPCNode()
+    results = await_awaitable(calls(async_w3(AsyncIPCProvider(node.path)), 20))
+    assert [int(result.hex(), 16) for result in results] == list(range(1, 21))
+    assert node.connections == 1
+
+def test_websocket_pipelining():
+    node = FakeWebsocketNode()
+    results = await_awaitable(calls(async_w3(AsyncWebsocketProvider(node.url)), 20))
+    assert [int(result.hex(), 16) for result in results] == list(range(1, 21))
+    assert node.connections == 1
+
+def test_ipc_reconnect():
+    node = FakeIPCNode(delay=0, drop_after=5)
+    results = await_awaitable(calls(async_w3(AsyncIPCProvider(node.path)), 20))
+    assert [int(result.hex(), 16) for result in results] == list(range(1, 21))
+    assert node.connections == 2
+
+def test_websocket_reconnect():
+    node = FakeWebsocketNode(delay=0, drop_after=5)
+    results = await_awaitable(calls(async_w3(AsyncWebsocketProvider(node.url)), 20))
+    assert [int(result.hex(), 16) for result in results] == list(range(1, 21))
+    assert node.connections == 2
+
+def test_get_async_w3_persistent():
+    assert isinstance(get_async_w3(Web3(IPCProvider('/tmp/node.ipc'))).provider, AsyncIPCProvider)
+    assert isinstance(get_async_w3(Web3(WebsocketProvider('ws://127.0.0.1:8546'))).provider, AsyncWebsocketProvider)
+
+def test_websocket_subscribe():
+    node = FakeHeadsNode()
+    async def heads():
+        provider = AsyncWebsocketProvider(node.url)
+        subscription = provider.subscribe(['newHeads'])
+        try:
+            return [int((await subscription.__anext__())['number'], 16) for _ in range(3)]
+        finally:
+            await subscription.aclose()
+            await provider.disconnect()
+    assert await_awaitable(heads()) == [1, 2, 3]
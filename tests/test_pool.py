@@ -0,0 +1,103 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+from aiohttp import web
+from web3 import Web3
+
+from multicall.exceptions import PayloadTooLarge
+from multicall.pool import AsyncHTTPProviderPool, Endpoint, HTTPProviderPool
+from multicall.utils import await_awaitable, get_async_w3
+
+ONE = '0x' + '00' * 31 + '01'
+
+
+class FakeNode:
+    """ A json-rpc server on localhost that answers every eth_call with 1, after `delay` seconds or with an http 500 when `broken`. """
+    def __init__(self, delay: float = 0, broken: bool = False) -> None:
+        self.delay = delay
+        self.broken = broken
+        self.requests = 0
+        self.calls = 0
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.url = f'http://127.0.0.1:{self.port}'
+        started = threading.Event()
+        threading.Thread(target=self.serve, args=(started,), daemon=True).start()
+        started.wait()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json()
+        self.calls += body['method'] == 'eth_call'
+        await asyncio.sleep(self.delay)
+        if self.broken:
+            return web.Response(status=500)
+        result = '0x1' if body['method'] == 'eth_chainId' else ONE
+        return web.json_response({'jsonrpc': '2.0', 'id': body['id'], 'result': result})
+
+    def serve(self, started: threading.Event) -> None:
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post('/', self.handle)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', self.port).start())
+        started.set()
+        loop.run_forever()
+
+
+def eth_call(w3: Web3, data: str = '0x') -> bytes:
+    return w3.eth.call({'to': '0x' + '11' * 20, 'data': data})
+
+async def eth_call_async(w3: Web3, data: str = '0x') -> bytes:
+    return await get_async_w3(w3).eth.call({'to': '0x' + '11' * 20, 'data': data})
+
+
+def test_pool_prefers_fast_endpoint():
+    fast, slow = FakeNode(), FakeNode(delay=0.05)
+    pool = HTTPProviderPool([slow.url, fast.url])
+    w3 = Web3(pool)
+    for _ in range(10):
+        assert eth_call(w3) == bytes.fromhex(ONE[2:])
+    # each endpoint gets tried once before latency decides
+    assert slow.requests == 1
+    assert fast.calls == 10
+
+def test_pool_ejects_failing_endpoint():
+    broken, working = FakeNode(broken=True), FakeNode()
+    pool = HTTPProviderPool([broken.url, working.url], max_failures=2, cooldown=60)
+    w3 = Web3(pool)
+    for _ in range(5):
+        eth_call(w3)
+    assert broken.requests == 2
+    assert pool.endpoints[0].ejected_until > time.monotonic()
+    # once the cooldown is over it gets another chance
+    pool.endpoints[0].ejected_until = 0
+    pool.endpoints[1].latency = 10
+    eth_call(w3)
+    assert broken.requests == 3
+
+def test_pool_async_hedging():
+    stuck, backup = FakeNode(delay=2), FakeNode(delay=0.01)
+    pool = HTTPProviderPool([stuck.url, backup.url], hedge=True, hedge_min_delay=0.1)
+    pool.endpoints[1].latency = 1
+    w3 = Web3(pool)
+    assert isinstance(get_async_w3(w3).provider, AsyncHTTPProviderPool)
+    start = time.monotonic()
+    assert await_awaitable(eth_call_async(w3)) == bytes.fromhex(ONE[2:])
+    assert time.monotonic() - start < 1
+    assert stuck.requests == backup.requests == 1
+    assert pool.endpoints[0].in_flight == 0
+
+def test_pool_max_bytes():
+    small, large = FakeNode(), FakeNode()
+    pool = HTTPProviderPool([Endpoint(small.url, max_bytes=100), Endpoint(large.url, max_bytes=1_000)])
+    w3 = Web3(pool)
+    eth_call(w3, '0x' + '00' * 500)
+    assert (small.calls, large.calls) == (0, 1)
+    with pytest.raises(PayloadTooLarge):
+        eth_call(w3, '0x' + '00' * 5_000)
@@ -0,0 +1,51 @@
+import asyncio
+from time import monotonic
+
+from brownie import web3
+from multicall.scheduler import Scheduler, get_scheduler
+from multicall.utils import await_awaitable
+
+
+async def hold(scheduler: Scheduler, name: str, priority: int, order: list, seconds: float = 0.01):
+    async with scheduler.request(priority):
+        order.append(name)
+        await asyncio.sleep(seconds)
+
+
+def test_get_scheduler_per_endpoint():
+    assert get_scheduler(web3) is get_scheduler(web3)
+
+def test_scheduler_priority():
+    async def run():
+        scheduler = Scheduler(max_in_flight=1)
+        order = []
+        tasks = [asyncio.ensure_future(hold(scheduler, f'low{i}', 0, order)) for i in range(3)]
+        tasks.append(asyncio.ensure_future(hold(scheduler, 'high', 1, order)))
+        await asyncio.gather(*tasks)
+        return scheduler, order
+    scheduler, order = await_awaitable(run())
+    assert order == ['low0', 'high', 'low1', 'low2']
+    assert scheduler.in_flight == 0
+
+def test_scheduler_cancelled_waiter():
+    async def run():
+        scheduler = Scheduler(max_in_flight=1)
+        order = []
+        first = asyncio.ensure_future(hold(scheduler, 'first', 0, order, 0.05))
+        cancelled = asyncio.ensure_future(hold(scheduler, 'cancelled', 0, order))
+        last = asyncio.ensure_future(hold(scheduler, 'last', 0, order))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.gather(first, cancelled, last, return_exceptions=True)
+        return scheduler, order
+    scheduler, order = await_awaitable(run())
+    assert order == ['first', 'last']
+    assert scheduler.in_flight == 0 and not scheduler.waiters
+
+def test_scheduler_rate_limit():
+    async def run():
+        scheduler = Scheduler(max_in_flight=0, rate=20, burst=1)
+        start = monotonic()
+        await asyncio.gather(*[hold(scheduler, str(i), 0, [], 0) for i in range(11)])
+        return monotonic() - start
+    assert await_awaitable(run()) >= 0.45
@@ -0,0 +1,33 @@
+import asyncio
+import gzip
+
+from multicall import session
+from multicall.session import close_session, compress, get_session
+from multicall.utils import await_awaitable
+
+
+def test_session_per_loop():
+    async def get():
+        return get_session()
+    first = await_awaitable(get())
+    assert await_awaitable(get()) is first
+    loop = asyncio.new_event_loop()
+    try:
+        other = loop.run_until_complete(get())
+        assert other is not first
+        loop.run_until_complete(close_session())
+        assert other.closed
+    finally:
+        loop.close()
+
+def test_compress():
+    data = b'{"jsonrpc": "2.0"}' * 1_000
+    headers = {}
+    assert compress(data, headers) == data and not headers
+    session.GZIP_MIN_BYTES = 1_000
+    try:
+        compressed = compress(data, headers)
+        assert headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(compressed) == data
+    finally:
+        session.GZIP_MIN_BYTES = 0
@@ -1,5 +1,8 @@
-from eth_abi import encode_abi
+import pickle
+
+from eth_abi import decode_abi, encode_abi
 from multicall import Signature
+from multicall.signature import get_signature
 
 args = ((1, 2, 3), '0x' + 'f' * 40, b'data')
 types = ['uint256[]', 'address', 'bytes']
@@ -21,3 +24,39 @@ def test_signature_decoding():
     sig = Signature('test()(uint256[],address,bytes)')
     data = encode_abi(types, args)
     assert sig.decode_data(data) == args
+
+
+def test_signature_decode_many_static():
+    sig = Signature('test()(uint256,address,bool,bytes4)')
+    static_types = ['uint256', 'address', 'bool', 'bytes4']
+    outputs = [encode_abi(static_types, (i, '0x' + 'f' * 40, i % 2 == 0, b'data')) for i in range(100)]
+    assert sig.word_decoders is not None
+    assert sig.decode_many(outputs) == [decode_abi(static_types, output) for output in outputs]
+
+
+def test_signature_decode_many_invalid():
+    sig = Signature('test()(uint8)')
+    results = sig.decode_many([encode_abi(['uint256'], [255]), encode_abi(['uint256'], [256]), b''])
+    assert results[0] == (255,)
+    assert isinstance(results[1], Exception)
+    assert isinstance(results[2], Exception)
+
+
+def test_signature_decode_many_dynamic():
+    sig = Signature('test()(uint256[],address,bytes)')
+    assert sig.word_decoders is None
+    assert sig.decode_many([encode_abi(types, args)]) == [args]
+
+
+def test_get_signature_cached():
+    sig = get_signature('balanceOf(address)(uint256)')
+    assert get_signature('balanceOf(address)(uint256)') is sig
+    assert pickle.loads(pickle.dumps(sig)) is sig
+
+
+def test_signature_encode_static():
+    sig = Signature('test(uint256,int8,address,bool,bytes4)()')
+    static_types = ['uint256', 'int8', 'address', 'bool', 'bytes4']
+    rows = [(i, -i, '0x' + f'{i:040x}', i % 2 == 0, b'ab') for i in range(100)]
+    assert sig.word_encoders is not None
+    assert [sig.encode_data(row) for row in rows] == [sig.fourbyte + encode_abi(static_types, row) for row in rows]
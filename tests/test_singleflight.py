@@ -0,0 +1,42 @@
+import asyncio
+
+from multicall.singleflight import get_in_flight, single_flight
+from multicall.utils import await_awaitable
+
+
+def test_single_flight_shares_result():
+    fetches = []
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return 'output'
+    async def run():
+        return await asyncio.gather(*[single_flight('key', fetch) for _ in range(5)])
+    assert await_awaitable(run()) == ['output'] * 5
+    assert len(fetches) == 1
+
+def test_single_flight_shares_exception():
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError('execution reverted')
+    async def run():
+        return await asyncio.gather(*[single_flight('key', fetch) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in await_awaitable(run()))
+
+def test_single_flight_owner_cancelled():
+    fetches = []
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return 'output'
+    async def run():
+        tasks = [asyncio.ensure_future(single_flight('key', fetch)) for _ in range(3)]
+        await asyncio.sleep(0.001)
+        tasks[0].cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return results, len(get_in_flight())
+    results, in_flight = await_awaitable(run())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ['output', 'output']
+    assert len(fetches) == 2
+    assert in_flight == 0
@@ -0,0 +1,34 @@
+from brownie import chain, web3
+from multicall import Call, Multicall
+from multicall.snapshot import Snapshot, get_snapshot
+from multicall.utils import await_awaitable
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+CALLS = [
+    Call(CHAI, 'totalSupply()(uint256)', [['supply', None]]),
+    Call(CHAI, ['balanceOf(address)(uint256)', CHAI], [['balance', None]]),
+]
+
+
+def test_snapshot():
+    with Snapshot() as snapshot:
+        multi = Multicall(CALLS)
+        chain.mine()
+        result = multi()
+    assert get_snapshot(web3) is None
+    assert multi.block_id == snapshot.block_number == web3.eth.block_number - 1
+    assert snapshot.block_hash == web3.eth.get_block(snapshot.block_number)['hash']
+    assert result == Multicall(CALLS, block_id=snapshot.block_number)()
+
+def test_snapshot_explicit_block():
+    with Snapshot() as snapshot:
+        assert Multicall(CALLS, block_id=snapshot.block_number - 10).block_id == snapshot.block_number - 10
+
+def test_snapshot_by_hash_async():
+    async def run():
+        async with Snapshot(by_hash=True) as snapshot:
+            multi = Multicall(CALLS)
+            assert multi.block_identifier == {'blockHash': snapshot.block_hash.hex()}
+            return snapshot, await multi.coroutine()
+    snapshot, result = await_awaitable(run())
+    assert result == Multicall(CALLS, block_id=snapshot.block_number)()
@@ -0,0 +1,45 @@
+from array import array
+
+from multicall.table import CallTable, new_column
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+DAI = '0x6B175474E89094C44Da98b954EedeAC495271d0F'
+
+
+def test_new_column():
+    assert new_column('uint8', 3) == array('B', [0, 0, 0])
+    assert new_column('int64', 2).typecode == 'q'
+    assert new_column('bool', 2).typecode == 'B'
+    assert new_column('uint256', 2) == [None, None]
+    assert new_column('string', 1) == [None]
+
+
+def test_call_table_single_target():
+    result = CallTable('balanceOf(address)(uint256)', CHAI, [CHAI, DAI])()
+    assert list(result.success) == [1, 1]
+    assert len(result.columns) == 1
+    assert all(isinstance(balance, int) for balance in result.columns[0])
+
+
+def test_call_table_many_targets():
+    result = CallTable('decimals()(uint8)', [CHAI, DAI])()
+    assert list(result.success) == [1, 1]
+    assert list(result.columns[0]) == [18, 18]
+
+
+def test_call_table_failures():
+    result = CallTable('decimals()(uint8)', [DAI, CHAI, '0x' + '0' * 40])()
+    assert list(result.success) == [1, 1, 0]
+    assert list(result.columns[0]) == [18, 18, 0]
+
+
+def test_call_table_repeated_rows():
+    result = CallTable('decimals()(uint8)', [DAI, DAI, DAI])()
+    assert list(result.columns[0]) == [18, 18, 18]
+
+
+def test_call_table_template():
+    table = CallTable('balanceOf(address)(uint256)', CHAI, [CHAI, [DAI]])
+    assert table.template is not None
+    assert table.targets_for(range(2)) == [(table.target(i), table.signature.encode_abi([holder])) for i, holder in enumerate([CHAI, DAI])]
+    assert CallTable('balanceOf(address)(uint256)', CHAI, [CHAI, DAI])().success == table().success
@@ -0,0 +1,43 @@
+import pytest
+from eth_abi import encode_abi
+from multicall.envelope import canonical_address
+from multicall.template import CallTemplate
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+HOLDERS = ['0x' + f'{i:040x}' for i in range(100)]
+
+
+def test_template_stamp_column():
+    template = CallTemplate('balanceOf(address)(uint256)')
+    assert template.stamp_column(HOLDERS) == [template.signature.fourbyte + encode_abi(['address'], [holder]) for holder in HOLDERS]
+    assert template.targets(CHAI, HOLDERS[:1]) == [(canonical_address(CHAI), template.stamp([HOLDERS[0]]))]
+
+
+def test_template_shared_args():
+    template = CallTemplate('allowance(address,address)(uint256)', [CHAI, HOLDERS[0]])
+    calldata = template.stamp_column(HOLDERS, position=1)
+    assert calldata[5] == template.signature.fourbyte + encode_abi(['address', 'address'], [CHAI, HOLDERS[5]])
+    assert template.stamp([HOLDERS[1], CHAI]) == template.signature.fourbyte + encode_abi(['address', 'address'], [HOLDERS[1], CHAI])
+    rows = [(HOLDERS[i], HOLDERS[i + 1]) for i in range(10)]
+    assert template.stamp_rows(rows) == [template.signature.fourbyte + encode_abi(['address', 'address'], row) for row in rows]
+
+
+def test_template_partial_args():
+    # The arguments left out are zero until they are patched in
+    template = CallTemplate('allowance(address,address)(uint256)', [CHAI])
+    assert bytes(template.buffer) == template.signature.fourbyte + encode_abi(['address', 'address'], [CHAI, '0x' + '0' * 40])
+    assert template.stamp_column(HOLDERS[:1], position=1) == [template.signature.fourbyte + encode_abi(['address', 'address'], [CHAI, HOLDERS[0]])]
+    with pytest.raises(ValueError):
+        CallTemplate('allowance(address,address)(uint256)', [CHAI, CHAI, CHAI])
+
+
+def test_template_invalid():
+    template = CallTemplate('test(uint8,bool)()')
+    with pytest.raises(Exception):
+        template.stamp_column([256])
+    with pytest.raises(Exception):
+        template.stamp([1, 1])
+    with pytest.raises(Exception):
+        template.stamp([1])
+    with pytest.raises(ValueError):
+        CallTemplate('test(bytes)()')
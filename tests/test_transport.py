@@ -0,0 +1,30 @@
+import asyncio
+
+from brownie import web3
+from multicall import Call
+from multicall.call import prep_calldata_args
+from multicall.transport import RETRY, BatchTransport, format_params
+from multicall.utils import await_awaitable
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+
+
+def test_format_params():
+    args = prep_calldata_args(CHAI, b'\x18\x16\x0d\xdd', 123, 1_000, None)
+    assert format_params(args) == [{'to': CHAI, 'data': '0x18160ddd', 'gas': '0x3e8'}, '0x7b']
+    args = prep_calldata_args(CHAI, b'', None, 0, '0x00')
+    assert format_params(args) == [{'to': CHAI, 'data': '0x'}, 'latest', {CHAI: {'code': '0x00'}}]
+
+def test_batch_transport():
+    transport = BatchTransport(web3, max_size=3)
+    calls = [Call(CHAI, 'totalSupply()(uint256)'), Call(CHAI, ['balanceOf(address)(uint256)', CHAI]), Call(CHAI, 'decimals()(uint8)')]
+    async def run():
+        return await asyncio.gather(*[transport.call(prep_calldata_args(call.target, call.data, None, 0, None)) for call in calls])
+    outputs = await_awaitable(run())
+    assert all(output is not RETRY for output in outputs)
+    assert calls[2].signature.decode_data(outputs[2]) == (18,)
+
+def test_batch_transport_single_request():
+    transport = BatchTransport(web3)
+    args = prep_calldata_args(CHAI, Call(CHAI, 'decimals()(uint8)').data, None, 0, None)
+    assert await_awaitable(transport.call(args)) is RETRY
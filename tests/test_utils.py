@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 from brownie import web3
@@ -65,3 +67,19 @@ def test_get_async_w3_with_async():
 
 def test_run_in_subprocess():
     assert await_awaitable(run_in_subprocess(work)) == None
+
+def test_await_awaitable_loop_thread():
+    async def running_loop():
+        return asyncio.get_event_loop()
+    with ThreadPoolExecutor(4) as executor:
+        loops = set(executor.map(lambda _: await_awaitable(running_loop()), range(8)))
+    assert loops == {get_loop_thread().loop}
+
+def test_await_awaitable_in_running_loop():
+    async def sync_caller():
+        return await_awaitable(coro())
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(sync_caller()) == None
+    finally:
+        loop.close()
@@ -0,0 +1,26 @@
+from brownie import accounts
+from multicall import Call
+from multicall.call import eth_balance
+from multicall.utils import await_awaitable
+from multicall.watcher import Watcher
+
+CHAI = '0x06AF07097C9Eeb7fD685c692751D5C66dB49c215'
+
+
+def test_watcher():
+    watcher = Watcher([
+        Call(CHAI, 'totalSupply()(uint256)', [['supply', None]]),
+        eth_balance(accounts[1].address, [['balance', None]]),
+    ], poll_interval=0.1)
+    async def first_two():
+        watch = watcher.watch()
+        try:
+            first = await watch.__anext__()
+            accounts[0].transfer(accounts[1], 1)
+            return first, await watch.__anext__()
+        finally:
+            await watch.aclose()
+    first, second = await_awaitable(first_two())
+    assert set(first.changes) == {'supply', 'balance'}
+    assert second.block > first.block
+    assert second.changes == {'balance': first.changes['balance'] + 1}